@@ -1,5 +1,5 @@
 const { Job, Template } = require('../models');
-const { addJob, cancelJob: cancelBullJob } = require('../services/queue.service');
+const { addJob, cancelJob: cancelBullJob, signalHandoffResolved } = require('../services/queue.service');
 const { Op } = require('sequelize');
 
 async function createJob(req, res) {
@@ -139,6 +139,8 @@ async function handoffComplete(req, res) {
       return res.status(404).json({ error: 'Job not found' });
     }
 
+    await signalHandoffResolved(job.id);
+
     const io = req.app.get('io');
     if (io) {
       io.to(`job:${job.id}`).emit('handoff_resolved', { jobId: job.id });
@@ -3,7 +3,7 @@ const { sendJobCompleteEmail, sendJobFailedEmail } = require('../services/email.
 
 async function workerCallback(req, res) {
   try {
-    const { jobId, status, result, error, logs, screenshots, executionTime, handoff } = req.body;
+    const { jobId, status, result, error, logs, screenshots, results, executionTime, handoff } = req.body;
 
     const job = await Job.findByPk(jobId, {
       include: [{ model: User, as: 'user' }],
@@ -14,7 +14,13 @@ async function workerCallback(req, res) {
     }
 
     if (status) job.status = status;
-    if (result !== undefined) job.result = result;
+    if (result !== undefined) {
+      job.result = result;
+    } else if (results && Array.isArray(results)) {
+      // Batch jobs stream per-item results until the aggregate arrives.
+      const current = job.result || {};
+      job.result = { ...current, items: [...(current.items || []), ...results] };
+    }
     if (error !== undefined) job.error = error;
     if (executionTime !== undefined) job.executionTime = executionTime;
 
@@ -45,6 +51,7 @@ async function workerCallback(req, res) {
         status: job.status,
         logs: logs || [],
         screenshots: screenshots || [],
+        results: results || [],
         result: job.result,
         error: job.error,
         executionTime: job.executionTime,
@@ -37,12 +37,36 @@ const templates = [
         },
         targetPrice: {
           type: 'number',
-          description: 'Target price threshold',
+          description: 'Target price threshold (default for every entry in productUrls)',
+        },
+        productUrls: {
+          type: 'array',
+          items: {
+            oneOf: [
+              { type: 'string' },
+              {
+                type: 'object',
+                properties: {
+                  url: { type: 'string' },
+                  targetPrice: { type: 'number' },
+                },
+                required: ['url'],
+              },
+            ],
+          },
+          description: 'Batch mode: product URLs, or { url, targetPrice } objects, checked in one job',
+        },
+        concurrency: {
+          type: 'number',
+          description: 'Batch mode: pages checked at once (capped by the worker)',
         },
       },
-      required: ['productUrl', 'targetPrice'],
+      anyOf: [
+        { required: ['productUrl', 'targetPrice'] },
+        { required: ['productUrls'] },
+      ],
     },
-    requiredFields: ['productUrl', 'targetPrice'],
+    requiredFields: ['productUrl or productUrls', 'targetPrice'],
     tags: ['price', 'monitoring', 'ecommerce'],
     isPublic: true,
     successRate: 90.0,
@@ -90,6 +114,15 @@ const templates = [
           type: 'string',
           description: 'URL to screenshot',
         },
+        urls: {
+          type: 'array',
+          items: { type: 'string' },
+          description: 'Batch mode: URLs to screenshot in one job',
+        },
+        concurrency: {
+          type: 'number',
+          description: 'Batch mode: pages captured at once (capped by the worker)',
+        },
         viewport: {
           type: 'object',
           properties: {
@@ -104,9 +137,12 @@ const templates = [
           default: false,
         },
       },
-      required: ['url'],
+      anyOf: [
+        { required: ['url'] },
+        { required: ['urls'] },
+      ],
     },
-    requiredFields: ['url'],
+    requiredFields: ['url or urls'],
     tags: ['screenshot', 'utility', 'capture'],
     isPublic: true,
     successRate: 95.0,
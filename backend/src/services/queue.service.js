@@ -2,6 +2,9 @@ const { Queue } = require('bullmq');
 const { createRedisClient } = require('../config/redis');
 
 let automationQueue = null;
+let publisher = null;
+
+const HANDOFF_CHANNEL_PREFIX = 'automateflow:handoff:';
 
 function getQueue() {
   if (!automationQueue) {
@@ -43,6 +46,21 @@ async function cancelJob(jobId) {
   return false;
 }
 
+function getPublisher() {
+  if (!publisher) {
+    publisher = createRedisClient();
+  }
+  return publisher;
+}
+
+async function signalHandoffResolved(jobId) {
+  const client = getPublisher();
+  const channel = `${HANDOFF_CHANNEL_PREFIX}${jobId}`;
+  // The flag covers a worker that subscribes just after the publish.
+  await client.set(`${channel}:resolved`, '1', 'EX', 600);
+  await client.publish(channel, 'resolved');
+}
+
 async function getQueueStats() {
   const queue = getQueue();
   const [waiting, active, completed, failed, delayed] = await Promise.all([
@@ -55,4 +73,4 @@ async function getQueueStats() {
   return { waiting, active, completed, failed, delayed };
 }
 
-module.exports = { getQueue, addJob, cancelJob, getQueueStats };
+module.exports = { getQueue, addJob, cancelJob, getQueueStats, signalHandoffResolved };
@@ -1,73 +1,333 @@
 import asyncio
 import base64
 import logging
+import os
 import time
-from typing import Optional
+from typing import Optional, Tuple
 
+import psutil
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 
-from .utils.anti_detection import get_random_user_agent, get_random_viewport, apply_stealth
-from .session_manager import save_session, load_session
+from .utils.anti_detection import get_random_user_agent, get_random_viewport, STEALTH_JS
+from .session_manager import load_session
 from .handoff import check_for_handoff
 from .utils.storage import upload_screenshot
+from .utils.network_profiles import RequestFilter
+from .utils.http_cache import http_cache
+from .utils.readiness import REQUEST_TRACKER_JS
+from .utils.image import perceptual_hash, hash_distance, encode_image, EncodingProfile, ENCODING_PROFILES
 
 logger = logging.getLogger(__name__)
 
+CONTEXT_POOL_SIZE = int(os.getenv("CONTEXT_POOL_SIZE", "2"))
+BROWSER_COUNT = max(1, int(os.getenv("BROWSER_COUNT", "1")))
+BROWSER_MAX_CONTEXTS = int(os.getenv("BROWSER_MAX_CONTEXTS", "200"))
+BROWSER_MAX_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "1500"))
+BROWSER_HEALTH_INTERVAL = float(os.getenv("BROWSER_HEALTH_INTERVAL", "15"))
+SCREENSHOT_MIN_INTERVAL = float(os.getenv("SCREENSHOT_MIN_INTERVAL", "1.0"))
+SCREENSHOT_MAX_INTERVAL = float(os.getenv("SCREENSHOT_MAX_INTERVAL", "20"))
+SCREENSHOT_DIFF_THRESHOLD = int(os.getenv("SCREENSHOT_DIFF_THRESHOLD", "3"))
+
+BROWSER_ARGS = [
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--window-size=1920,1080",
+]
+
+
+class BrowserShard:
+    def __init__(self, index: int):
+        self.index = index
+        self.browser: Optional[Browser] = None
+        self.tag = ""
+        self.contexts_served = 0
+        self.restarting = False
+
+    def is_healthy(self) -> bool:
+        return self.browser is not None and self.browser.is_connected()
+
+    def rss_mb(self) -> Optional[float]:
+        # Chromium ignores unknown switches, so the tag lets us find this
+        # shard's browser process and sum RSS over its renderer children.
+        for proc in psutil.process_iter(["cmdline"]):
+            try:
+                if self.tag in (proc.info["cmdline"] or []):
+                    procs = [proc] + proc.children(recursive=True)
+                    return sum(p.memory_info().rss for p in procs) / (1024 * 1024)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return None
+
 
 class BrowserManager:
     def __init__(self):
         self.playwright = None
-        self.browser: Optional[Browser] = None
+        self.shards = [BrowserShard(i) for i in range(BROWSER_COUNT)]
+        self._active_contexts = {}
+        self._retiring = {}
+        self._stopping = False
+        self._health_task: Optional[asyncio.Task] = None
+        self._context_pool: asyncio.Queue = asyncio.Queue()
+        self._refill_needed = asyncio.Event()
+        self._refill_task: Optional[asyncio.Task] = None
+        self._restart_tasks = set()
+        self._page_activity = {}
+        self._request_filters = {}
+        self._restored_sessions = set()
+
+    @property
+    def browser(self) -> Optional[Browser]:
+        shard = self._pick_shard()
+        return shard.browser if shard else None
 
     async def start(self):
         self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(
-            headless=True,
-            args=[
-                "--no-sandbox",
-                "--disable-setuid-sandbox",
-                "--disable-dev-shm-usage",
-                "--disable-blink-features=AutomationControlled",
-                "--disable-infobars",
-                "--window-size=1920,1080",
-            ],
-        )
-        logger.info("Browser started")
+        for shard in self.shards:
+            await self._launch(shard)
+        logger.info(f"Started {len(self.shards)} browser process(es)")
+
+        self._health_task = asyncio.create_task(self._health_loop())
+        if CONTEXT_POOL_SIZE > 0:
+            self._refill_task = asyncio.create_task(self._refill_loop())
+            self._refill_needed.set()
 
     async def stop(self):
-        if self.browser:
-            await self.browser.close()
+        self._stopping = True
+        for task in (self._health_task, self._refill_task, *self._restart_tasks):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        while not self._context_pool.empty():
+            context = self._context_pool.get_nowait()
+            await self._discard_context(context)
+        for browser in [shard.browser for shard in self.shards] + list(self._retiring.values()):
+            if browser:
+                try:
+                    await browser.close()
+                except Exception as e:
+                    logger.debug(f"Failed to close browser: {e}")
         if self.playwright:
             await self.playwright.stop()
+        if http_cache is not None:
+            logger.info(f"HTTP cache stats: {http_cache.stats()}")
         logger.info("Browser stopped")
 
-    async def create_context(self, job_id: str) -> BrowserContext:
-        user_agent = get_random_user_agent()
-        viewport = get_random_viewport()
+    async def _launch(self, shard: BrowserShard):
+        shard.tag = f"--automateflow-shard={os.getpid()}-{shard.index}-{time.monotonic_ns()}"
+        browser = await self.playwright.chromium.launch(headless=True, args=BROWSER_ARGS + [shard.tag])
+        browser.on("disconnected", lambda b: self._on_disconnected(shard, b))
+        shard.browser = browser
+        shard.contexts_served = 0
+        self._active_contexts[id(browser)] = 0
+        logger.info(f"Browser {shard.index} launched")
+
+    def _on_disconnected(self, shard: BrowserShard, browser: Browser):
+        self._active_contexts.pop(id(browser), None)
+        self._retiring.pop(id(browser), None)
+        if shard.browser is browser and not self._stopping and not shard.restarting:
+            logger.error(f"Browser {shard.index} disconnected unexpectedly, relaunching")
+            task = asyncio.create_task(self._restart(shard))
+            self._restart_tasks.add(task)
+            task.add_done_callback(self._on_restart_done)
+
+    def _on_restart_done(self, task: asyncio.Task):
+        self._restart_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Browser relaunch task failed: {task.exception()}")
+
+    async def _restart(self, shard: BrowserShard):
+        if shard.restarting:
+            return
+        shard.restarting = True
+        old = shard.browser
+        try:
+            await self._launch(shard)
+        except Exception as e:
+            logger.error(f"Failed to relaunch browser {shard.index}: {e}")
+            return
+        finally:
+            shard.restarting = False
+
+        if old is not None and old.is_connected():
+            self._retiring[id(old)] = old
+            await self._close_if_idle(old)
+
+    async def _close_if_idle(self, browser: Browser):
+        if id(browser) in self._retiring and self._active_contexts.get(id(browser), 0) <= 0:
+            self._retiring.pop(id(browser), None)
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.debug(f"Failed to close retired browser: {e}")
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(BROWSER_HEALTH_INTERVAL)
+            for shard in self.shards:
+                if shard.restarting:
+                    continue
+                try:
+                    if shard.browser is None or not shard.browser.is_connected():
+                        logger.error(f"Browser {shard.index} is not connected, relaunching")
+                        await self._restart(shard)
+                        continue
+                    if shard.contexts_served >= BROWSER_MAX_CONTEXTS:
+                        logger.info(f"Browser {shard.index} served {shard.contexts_served} contexts, recycling")
+                        await self._restart(shard)
+                        continue
+                    rss = await asyncio.to_thread(shard.rss_mb)
+                    if rss is not None and rss > BROWSER_MAX_RSS_MB:
+                        logger.info(f"Browser {shard.index} RSS {rss:.0f}MB over limit, recycling")
+                        await self._restart(shard)
+                except Exception as e:
+                    logger.warning(f"Browser {shard.index} health check failed: {e}")
+
+    def _pick_shard(self) -> Optional[BrowserShard]:
+        healthy = [shard for shard in self.shards if shard.is_healthy()]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda shard: self._active_contexts.get(id(shard.browser), 0))
+
+    def _is_current(self, context: BrowserContext) -> bool:
+        return any(shard.browser is context.browser and shard.is_healthy() for shard in self.shards)
+
+    async def _wait_for_shard(self, timeout: float = 30) -> BrowserShard:
+        deadline = time.monotonic() + timeout
+        while True:
+            shard = self._pick_shard()
+            if shard is not None:
+                return shard
+            if time.monotonic() >= deadline:
+                raise RuntimeError("No healthy browser available")
+            await asyncio.sleep(0.5)
 
-        context = await self.browser.new_context(
-            user_agent=user_agent,
-            viewport=viewport,
+    async def _new_warm_context(self) -> BrowserContext:
+        shard = await self._wait_for_shard()
+        context = await shard.browser.new_context(
+            user_agent=get_random_user_agent(),
+            viewport=get_random_viewport(),
             locale="en-US",
             timezone_id="America/New_York",
             ignore_https_errors=True,
         )
+        await context.add_init_script(STEALTH_JS)
+        await context.add_init_script(REQUEST_TRACKER_JS)
+        if http_cache is not None:
+            # Routes registered later run first, so a job's RequestFilter
+            # decides on blocking before falling back to the cache.
+            await context.route("**/*", http_cache.handle)
+        return context
+
+    async def _refill_loop(self):
+        while True:
+            await self._refill_needed.wait()
+            self._refill_needed.clear()
+            while self._context_pool.qsize() < CONTEXT_POOL_SIZE:
+                try:
+                    context = await self._new_warm_context()
+                except Exception as e:
+                    logger.warning(f"Failed to warm browser context: {e}")
+                    await asyncio.sleep(1)
+                    self._refill_needed.set()
+                    break
+                self._context_pool.put_nowait(context)
+
+    async def create_context(
+        self, job_id: str, network_profile: str = "full", session_key: Optional[str] = None
+    ) -> BrowserContext:
+        context = None
+        while not self._context_pool.empty():
+            candidate = self._context_pool.get_nowait()
+            if self._is_current(candidate):
+                context = candidate
+                break
+            await self._discard_context(candidate)
+        if context is None:
+            context = await self._new_warm_context()
+            logger.debug(f"Context pool empty, created a cold context for job {job_id}")
+        self._refill_needed.set()
+
+        browser_key = id(context.browser)
+        self._active_contexts[browser_key] = self._active_contexts.get(browser_key, 0) + 1
+        for shard in self.shards:
+            if shard.browser is context.browser:
+                shard.contexts_served += 1
+
+        request_filter = RequestFilter(network_profile)
+        if request_filter.is_active:
+            await context.route("**/*", request_filter.handle)
+            self._request_filters[id(context)] = request_filter
 
-        await load_session(context, job_id)
+        if session_key and await load_session(context, session_key):
+            self._restored_sessions.add(id(context))
         return context
 
-    async def take_screenshot(self, page: Page, job_id: str) -> Optional[str]:
+    def session_restored(self, context: BrowserContext) -> bool:
+        return id(context) in self._restored_sessions
+
+    def network_stats(self, context: BrowserContext) -> Optional[dict]:
+        request_filter = self._request_filters.get(id(context))
+        stats = request_filter.stats() if request_filter else None
+        if http_cache is not None:
+            stats = {**(stats or {}), "httpCache": http_cache.stats()}
+        return stats
+
+    async def release_context(self, context: BrowserContext):
+        self._restored_sessions.discard(id(context))
+        request_filter = self._request_filters.pop(id(context), None)
+        if request_filter and request_filter.blocked_requests:
+            logger.info(f"Network profile {request_filter.profile} blocked {request_filter.blocked_requests} requests: {request_filter.blocked_by_type}")
+
+        browser = context.browser
+        if browser is not None and id(browser) in self._active_contexts:
+            self._active_contexts[id(browser)] -= 1
+
+        # Contexts are never handed to a second job: routes, init scripts and
+        # per-origin storage from this job can't be reliably cleared. The pool
+        # only saves the cost of creating one.
+        await self._discard_context(context)
+        if browser is not None:
+            await self._close_if_idle(browser)
+
+    async def _discard_context(self, context: BrowserContext):
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Failed to close browser context: {e}")
+
+    async def capture_screenshot(self, page: Page, profile: str = "preview", full_page: bool = False) -> Tuple[bytes, EncodingProfile]:
+        encoding = ENCODING_PROFILES[profile]
+        if encoding.needs_reencode():
+            screenshot_bytes = await page.screenshot(full_page=full_page)
+            screenshot_bytes = await asyncio.to_thread(encode_image, screenshot_bytes, encoding)
+        elif encoding.format == "JPEG":
+            screenshot_bytes = await page.screenshot(full_page=full_page, type="jpeg", quality=encoding.quality or 80)
+        else:
+            screenshot_bytes = await page.screenshot(full_page=full_page)
+        return screenshot_bytes, encoding
+
+    async def upload_capture(self, screenshot_bytes: bytes, encoding: EncodingProfile, job_id: str) -> str:
+        return await upload_screenshot(
+            screenshot_bytes, job_id, content_type=encoding.mime_type, extension=encoding.extension
+        )
+
+    async def take_screenshot(self, page: Page, job_id: str, profile: str = "preview") -> Optional[str]:
         try:
-            screenshot_bytes = await page.screenshot(full_page=False)
-            url = upload_screenshot(screenshot_bytes, job_id)
-            return url
+            screenshot_bytes, encoding = await self.capture_screenshot(page, profile)
+            return await self.upload_capture(screenshot_bytes, encoding, job_id)
         except Exception as e:
             logger.warning(f"Failed to take screenshot: {e}")
             return None
 
-    async def take_screenshot_base64(self, page: Page) -> Optional[str]:
+    async def take_screenshot_base64(self, page: Page, profile: str = "llm") -> Optional[str]:
         try:
-            screenshot_bytes = await page.screenshot(full_page=False)
+            screenshot_bytes, _ = await self.capture_screenshot(page, profile)
             return base64.b64encode(screenshot_bytes).decode("utf-8")
         except Exception as e:
             logger.warning(f"Failed to take screenshot: {e}")
@@ -79,17 +339,58 @@ class BrowserManager:
         )
         return screenshot_task
 
+    def mark_activity(self, page: Page):
+        activity = self._page_activity.get(id(page))
+        if activity:
+            activity.set()
+
     async def _screenshot_loop(self, page: Page, job_id: str, callback_fn, interval: float):
-        while True:
-            try:
-                url = await self.take_screenshot(page, job_id)
-                if url and callback_fn:
-                    await callback_fn(screenshots=[url])
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.warning(f"Screenshot loop error: {e}")
-            await asyncio.sleep(interval)
+        activity = asyncio.Event()
+        self._page_activity[id(page)] = activity
+
+        def on_navigated(frame):
+            if frame == page.main_frame:
+                activity.set()
+
+        page.on("framenavigated", on_navigated)
+        last_hash = None
+        current_interval = interval
+        # Small edits (typed text, a price change) barely move the coarse
+        # hash, so the first frame after an action or navigation always goes out.
+        force_upload = True
+
+        try:
+            while True:
+                try:
+                    screenshot_bytes, encoding = await self.capture_screenshot(page, "preview")
+                    frame_hash = await asyncio.to_thread(perceptual_hash, screenshot_bytes)
+                    if force_upload or hash_distance(frame_hash, last_hash) > SCREENSHOT_DIFF_THRESHOLD:
+                        force_upload = False
+                        last_hash = frame_hash
+                        current_interval = interval
+                        url = await self.upload_capture(screenshot_bytes, encoding, job_id)
+                        if url and callback_fn:
+                            await callback_fn(screenshots=[url])
+                    else:
+                        current_interval = min(current_interval * 1.5, SCREENSHOT_MAX_INTERVAL)
+                except asyncio.CancelledError:
+                    break
+                except Exception as e:
+                    logger.warning(f"Screenshot loop error: {e}")
+
+                try:
+                    await asyncio.wait_for(activity.wait(), timeout=current_interval)
+                except asyncio.TimeoutError:
+                    continue
+                # Something just happened on the page: give it a moment to
+                # render, then go back to the base cadence.
+                activity.clear()
+                current_interval = interval
+                force_upload = True
+                await asyncio.sleep(SCREENSHOT_MIN_INTERVAL)
+        finally:
+            page.remove_listener("framenavigated", on_navigated)
+            self._page_activity.pop(id(page), None)
 
 
 browser_manager = BrowserManager()
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_FLUSH_INTERVAL = float(os.getenv("CALLBACK_FLUSH_INTERVAL", "1.0"))
+CALLBACK_MAX_BATCH = int(os.getenv("CALLBACK_MAX_BATCH", "50"))
+
+COALESCED_FIELDS = ("logs", "screenshots", "results")
+
+
+# Holds logs/screenshots/results-only callbacks for up to flush_interval
+# seconds (or max_batch items) and sends them as one request. Any other field
+# (status, result, error, handoff, ...) is sent right away along with whatever
+# is pending.
+class CallbackBuffer:
+    def __init__(self, send_fn, flush_interval: float = CALLBACK_FLUSH_INTERVAL, max_batch: int = CALLBACK_MAX_BATCH):
+        self.send_fn = send_fn
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending = {field: [] for field in COALESCED_FIELDS}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def __call__(self, **kwargs):
+        immediate = any(key not in COALESCED_FIELDS for key in kwargs)
+
+        async with self._lock:
+            for field in COALESCED_FIELDS:
+                self.pending[field].extend(kwargs.pop(field, None) or [])
+
+            if immediate or self._pending_count() >= self.max_batch or self.flush_interval <= 0:
+                await self._flush_locked(**kwargs)
+            elif self._pending_count() and self._timer is None:
+                self._timer = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        async with self._lock:
+            await self._flush_locked()
+
+    async def close(self):
+        await self.flush()
+
+    def _pending_count(self) -> int:
+        return sum(len(items) for items in self.pending.values())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        async with self._lock:
+            self._timer = None
+            await self._flush_locked()
+
+    async def _flush_locked(self, **extra):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+
+        payload = dict(extra)
+        for field in COALESCED_FIELDS:
+            if self.pending[field]:
+                payload[field] = self.pending[field]
+                self.pending[field] = []
+
+        if not payload:
+            return
+
+        try:
+            await self.send_fn(**payload)
+        except Exception as e:
+            logger.error(f"Failed to flush callback batch: {e}")
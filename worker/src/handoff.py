@@ -1,10 +1,28 @@
 import asyncio
+import json
 import logging
+import os
 import re
 from typing import Optional
 
+from redis import asyncio as aioredis
+
+from .utils.selector_probe import find_first_visible
+
 logger = logging.getLogger(__name__)
 
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+HANDOFF_CHANNEL_PREFIX = "automateflow:handoff:"
+
+_redis_client = None
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = aioredis.from_url(REDIS_URL)
+    return _redis_client
+
 CAPTCHA_SELECTORS = [
     'iframe[src*="recaptcha"]',
     'iframe[src*="hcaptcha"]',
@@ -42,31 +60,147 @@ OTP_TEXT_PATTERNS = [
 ]
 
 
+HANDOFF_BINDING = "__automateflowHandoff"
+
+# Installed on every document in the context but only watches top-level
+# pages (CAPTCHA iframes are matched from their parent, and third-party
+# frames shouldn't trigger handoffs). Re-checks only after DOM mutations
+# (debounced), and reports each reason once per document through the
+# exposed binding, so Python never has to poll.
+HANDOFF_WATCH_JS = """
+(() => {
+    if (window !== window.top) return;
+    const config = %s;
+    const textPatterns = config.textPatterns.map((p) => new RegExp(p, 'i'));
+    const reported = new Set();
+    let scheduled = false;
+    let lastTextScan = 0;
+    let trailingScan = null;
+
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+
+    const report = (reason) => {
+        if (reported.has(reason) || !window[config.binding]) return;
+        reported.add(reason);
+        window[config.binding](reason);
+    };
+
+    const scan = () => {
+        scheduled = false;
+        for (const selector of config.captchaSelectors) {
+            const el = document.querySelector(selector);
+            if (el && isVisible(el)) return report('CAPTCHA detected: ' + selector);
+        }
+        for (const selector of config.otpSelectors) {
+            const el = document.querySelector(selector);
+            if (el && isVisible(el)) return report('OTP input detected: ' + selector);
+        }
+        const now = Date.now();
+        if (document.body && now - lastTextScan < 1000) {
+            // Throttled: make sure text that rendered meanwhile still gets
+            // checked even if no further mutation arrives.
+            if (trailingScan === null) {
+                trailingScan = setTimeout(() => {
+                    trailingScan = null;
+                    scan();
+                }, 1000 - (now - lastTextScan));
+            }
+        } else if (document.body) {
+            lastTextScan = now;
+            const text = document.body.innerText;
+            for (let i = 0; i < textPatterns.length; i++) {
+                if (textPatterns[i].test(text)) return report('OTP page detected: ' + config.textPatterns[i]);
+            }
+        }
+    };
+
+    const schedule = () => {
+        if (scheduled) return;
+        scheduled = true;
+        setTimeout(scan, 250);
+    };
+
+    const start = () => {
+        schedule();
+        new MutationObserver(schedule).observe(document.documentElement, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ['style', 'class', 'hidden', 'src'],
+        });
+    };
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', start, { once: true });
+    } else {
+        start();
+    }
+})();
+""" % json.dumps({
+    "binding": HANDOFF_BINDING,
+    "captchaSelectors": CAPTCHA_SELECTORS,
+    "otpSelectors": OTP_PATTERNS,
+    "textPatterns": OTP_TEXT_PATTERNS,
+})
+
+
+# Exactly the strings HANDOFF_WATCH_JS can report. The binding is visible to
+# page scripts, so anything else is a site calling it, not our watcher.
+KNOWN_HANDOFF_REASONS = (
+    {f"CAPTCHA detected: {s}" for s in CAPTCHA_SELECTORS}
+    | {f"OTP input detected: {s}" for s in OTP_PATTERNS}
+    | {f"OTP page detected: {p}" for p in OTP_TEXT_PATTERNS}
+)
+
+
+class HandoffWatcher:
+    def __init__(self):
+        self.reasons = []
+        self.detected = asyncio.Event()
+
+    async def attach(self, context):
+        await context.expose_binding(HANDOFF_BINDING, self._on_handoff)
+        await context.add_init_script(HANDOFF_WATCH_JS)
+
+    def _on_handoff(self, source, reason: str):
+        if reason not in KNOWN_HANDOFF_REASONS:
+            logger.warning(f"Ignoring unrecognised handoff signal from page: {str(reason)[:200]!r}")
+            return
+        logger.info(f"Handoff signalled by page: {reason}")
+        self.reasons.append(reason)
+        self.detected.set()
+
+    async def consume(self, page) -> Optional[str]:
+        if not self.reasons:
+            return None
+        self.reasons.clear()
+        self.detected.clear()
+        # Only park the job on what we can see ourselves; this runs just
+        # when the page has signalled, so quiet steps stay probe-free.
+        reason = await check_for_handoff(page)
+        if reason is None:
+            logger.info("Page handoff signal not confirmed, continuing")
+        return reason
+
+
 async def detect_captcha(page) -> Optional[str]:
-    for selector in CAPTCHA_SELECTORS:
-        try:
-            element = await page.query_selector(selector)
-            if element:
-                is_visible = await element.is_visible()
-                if is_visible:
-                    logger.info(f"CAPTCHA detected via selector: {selector}")
-                    return f"CAPTCHA detected: {selector}"
-        except Exception:
-            continue
+    match = await find_first_visible(page, CAPTCHA_SELECTORS)
+    if match:
+        selector, _ = match
+        logger.info(f"CAPTCHA detected via selector: {selector}")
+        return f"CAPTCHA detected: {selector}"
     return None
 
 
 async def detect_otp(page) -> Optional[str]:
-    for pattern in OTP_PATTERNS:
-        try:
-            element = await page.query_selector(pattern)
-            if element:
-                is_visible = await element.is_visible()
-                if is_visible:
-                    logger.info(f"OTP input detected via: {pattern}")
-                    return f"OTP input detected: {pattern}"
-        except Exception:
-            continue
+    match = await find_first_visible(page, OTP_PATTERNS)
+    if match:
+        pattern, _ = match
+        logger.info(f"OTP input detected via: {pattern}")
+        return f"OTP input detected: {pattern}"
 
     try:
         body_text = await page.inner_text("body")
@@ -93,18 +227,39 @@ async def check_for_handoff(page) -> Optional[str]:
     return None
 
 
-async def wait_for_handoff_resolution(callback_fn, job_id: str, timeout: int = 300):
+async def wait_for_handoff_resolution(job_id: str, timeout: int = 300) -> bool:
     logger.info(f"Waiting for handoff resolution for job {job_id} (timeout: {timeout}s)")
 
-    resolved = asyncio.Event()
-
-    async def on_resolve():
-        resolved.set()
+    client = get_redis_client()
+    channel = f"{HANDOFF_CHANNEL_PREFIX}{job_id}"
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel)
 
     try:
-        await asyncio.wait_for(resolved.wait(), timeout=timeout)
-        logger.info(f"Handoff resolved for job {job_id}")
-        return True
-    except asyncio.TimeoutError:
-        logger.warning(f"Handoff timeout for job {job_id}")
-        return False
+        # Subscribe first, then check the flag, so a resolution published in
+        # between is never missed.
+        if await client.getdel(f"{channel}:resolved"):
+            logger.info(f"Handoff resolved for job {job_id}")
+            return True
+
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                logger.warning(f"Handoff timeout for job {job_id}")
+                return False
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 5))
+            if message is not None:
+                await client.delete(f"{channel}:resolved")
+                logger.info(f"Handoff resolved for job {job_id}")
+                return True
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+
+
+async def close_redis_client():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", "600"))
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL", "")
+REDIS_KEY_PREFIX = "automateflow:llm-cache:"
+
+# Seconds a response stays valid, per calling template.
+CACHE_TTLS = {
+    "price_monitor": 300,
+    "form_filler": 86400,
+    "linkedin_scraper": 3600,
+    "pdf_invoice_downloader": 3600,
+    "custom_task": 600,
+}
+
+
+def make_cache_key(prompt: str, image_base64: Optional[str], require_vision: bool) -> str:
+    digest = hashlib.sha256()
+    digest.update(b"vision" if require_vision else b"text")
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    digest.update(b"\0")
+    if image_base64:
+        digest.update(image_base64.encode("ascii"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, max_bytes: int = LLM_CACHE_MAX_BYTES, redis_url: str = LLM_CACHE_REDIS_URL):
+        self.max_bytes = max_bytes
+        self.redis_url = redis_url
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._redis = None
+
+    def ttl_for(self, scope: str) -> int:
+        return CACHE_TTLS.get(scope, LLM_CACHE_DEFAULT_TTL)
+
+    def get_redis(self):
+        if self._redis is None and self.redis_url:
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if time.time() < expires_at:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self._evict(key)
+
+        client = self.get_redis()
+        if client is not None:
+            try:
+                raw = await client.get(REDIS_KEY_PREFIX + key)
+                if raw is not None:
+                    value = raw.decode("utf-8")
+                    ttl = await client.ttl(REDIS_KEY_PREFIX + key)
+                    self._store_local(key, value, max(ttl, 1))
+                    self.hits += 1
+                    return value
+            except Exception as e:
+                logger.warning(f"LLM cache Redis read failed: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: int):
+        if ttl <= 0 or not value:
+            return
+        self._store_local(key, value, ttl)
+
+        client = self.get_redis()
+        if client is not None:
+            try:
+                await client.set(REDIS_KEY_PREFIX + key, value, ex=ttl)
+            except Exception as e:
+                logger.warning(f"LLM cache Redis write failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / total if total else 0.0,
+        }
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _store_local(self, key: str, value: str, ttl: int):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._evict(key)
+        self.entries[key] = (value, time.time() + ttl)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._evict(oldest)
+
+    def _evict(self, key: str):
+        value, _ = self.entries.pop(key)
+        self.size_bytes -= len(value.encode("utf-8"))
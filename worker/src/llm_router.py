@@ -1,38 +1,137 @@
+import asyncio
 import os
 import time
 import json
 import logging
 import base64
+from collections import deque
 from typing import Optional
 
 import httpx
 
+from .llm_cache import LLMResponseCache, make_cache_key
+from .utils.image import image_mime_type
+from .utils.rate_limiter import TokenBucket, close_redis_client as close_rate_limiter
+
 logger = logging.getLogger(__name__)
 
+HEALTH_WINDOW = int(os.getenv("LLM_HEALTH_WINDOW", "50"))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("LLM_CIRCUIT_BREAKER_THRESHOLD", "3"))
+CIRCUIT_BREAKER_COOLDOWN = float(os.getenv("LLM_CIRCUIT_BREAKER_COOLDOWN", "30"))
+CIRCUIT_BREAKER_MAX_COOLDOWN = 600
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "4"))
+LLM_HEDGE_MAX_IN_FLIGHT = 2
+
 
 class LLMProvider:
-    def __init__(self, name, api_key_env, rate_limit_per_min, supports_vision=False):
+    def __init__(self, name, api_key_env, rate_limit_per_min, supports_vision=False, timeout=60, max_connections=10):
         self.name = name
         self.api_key = os.getenv(api_key_env, "")
         self.rate_limit = rate_limit_per_min
         self.supports_vision = supports_vision
-        self.request_timestamps = []
+        self.limiter = TokenBucket(name, rate_limit_per_min)
         self.is_available = bool(self.api_key)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+        self.outcomes = deque(maxlen=HEALTH_WINDOW)
+        self.consecutive_failures = 0
+        self.circuit_open_until = 0.0
+
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=120,
+                ),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
     def can_make_request(self):
+        return self.is_available and self.limiter.has_capacity()
+
+    async def acquire_request_slot(self) -> bool:
         if not self.is_available:
             return False
-        now = time.time()
-        self.request_timestamps = [t for t in self.request_timestamps if now - t < 60]
-        return len(self.request_timestamps) < self.rate_limit
-
-    def record_request(self):
-        self.request_timestamps.append(time.time())
+        return await self.limiter.try_acquire()
+
+    def next_slot_at(self) -> float:
+        return time.time() + self.limiter.seconds_until_available()
+
+    def is_circuit_open(self) -> bool:
+        return time.time() < self.circuit_open_until
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.outcomes.append("ok")
+        self.consecutive_failures = 0
+
+    def record_failure(self, empty: bool = False):
+        self.outcomes.append("empty" if empty else "error")
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+            trips = self.consecutive_failures - CIRCUIT_BREAKER_THRESHOLD
+            cooldown = min(CIRCUIT_BREAKER_COOLDOWN * (2 ** trips), CIRCUIT_BREAKER_MAX_COOLDOWN)
+            self.circuit_open_until = time.time() + cooldown
+            logger.warning(
+                f"Provider {self.name} circuit open for {cooldown:.0f}s "
+                f"after {self.consecutive_failures} consecutive failures"
+            )
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+        return ordered[index]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o == "error") / len(self.outcomes)
+
+    def empty_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for o in self.outcomes if o == "empty") / len(self.outcomes)
+
+    def expected_latency(self) -> float:
+        if not self.outcomes:
+            # Never tried: rank it early so it gets measured.
+            return 0.0
+        p50 = self.latency_percentile(0.5)
+        if p50 is None:
+            # Only failures so far: assume each attempt can burn the timeout.
+            return self.timeout * (self.error_rate() + self.empty_rate())
+        p95 = self.latency_percentile(0.95)
+        base = 0.7 * p50 + 0.3 * p95
+        failure_rate = min(self.error_rate() + self.empty_rate(), 0.9)
+        # A failed attempt costs roughly a full call before falling through.
+        return base / (1 - failure_rate)
+
+    def health(self) -> dict:
+        return {
+            "p50": self.latency_percentile(0.5),
+            "p95": self.latency_percentile(0.95),
+            "errorRate": self.error_rate(),
+            "emptyRate": self.empty_rate(),
+            "circuitOpen": self.is_circuit_open(),
+        }
 
 
 class GoogleAIProvider(LLMProvider):
     def __init__(self):
-        super().__init__("google_ai_studio", "GOOGLE_AI_STUDIO_KEY", 15, supports_vision=True)
+        super().__init__("google_ai_studio", "GOOGLE_AI_STUDIO_KEY", 15, supports_vision=True, max_connections=5)
         self.base_url = "https://generativelanguage.googleapis.com/v1beta"
 
     async def generate(self, prompt: str, image_base64: Optional[str] = None) -> str:
@@ -43,23 +142,23 @@ class GoogleAIProvider(LLMProvider):
         if image_base64:
             parts.append({
                 "inline_data": {
-                    "mime_type": "image/png",
+                    "mime_type": image_mime_type(image_base64),
                     "data": image_base64,
                 }
             })
 
         payload = {"contents": [{"parts": parts}]}
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            data = resp.json()
-            candidates = data.get("candidates", [])
-            if candidates:
-                content = candidates[0].get("content", {})
-                parts = content.get("parts", [])
-                if parts:
-                    return parts[0].get("text", "")
+        client = self.get_client()
+        resp = await client.post(url, json=payload)
+        resp.raise_for_status()
+        data = resp.json()
+        candidates = data.get("candidates", [])
+        if candidates:
+            content = candidates[0].get("content", {})
+            parts = content.get("parts", [])
+            if parts:
+                return parts[0].get("text", "")
         return ""
 
 
@@ -80,11 +179,11 @@ class GroqProvider(LLMProvider):
             "max_tokens": 4096,
         }
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
+        client = self.get_client()
+        resp = await client.post(url, json=payload, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
 
 
 class CerebrasProvider(LLMProvider):
@@ -104,11 +203,11 @@ class CerebrasProvider(LLMProvider):
             "max_tokens": 4096,
         }
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
+        client = self.get_client()
+        resp = await client.post(url, json=payload, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
 
 
 class OpenRouterProvider(LLMProvider):
@@ -128,7 +227,7 @@ class OpenRouterProvider(LLMProvider):
         if image_base64:
             content.append({
                 "type": "image_url",
-                "image_url": {"url": f"data:image/png;base64,{image_base64}"},
+                "image_url": {"url": f"data:{image_mime_type(image_base64)};base64,{image_base64}"},
             })
 
         model = "qwen/qwen2.5-vl-7b-instruct" if image_base64 else "qwen/qwen2.5-72b-instruct"
@@ -138,16 +237,16 @@ class OpenRouterProvider(LLMProvider):
             "max_tokens": 4096,
         }
 
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            return data["choices"][0]["message"]["content"]
+        client = self.get_client()
+        resp = await client.post(url, json=payload, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"]
 
 
 class HuggingFaceProvider(LLMProvider):
     def __init__(self):
-        super().__init__("huggingface", "HF_API_TOKEN", 60, supports_vision=True)
+        super().__init__("huggingface", "HF_API_TOKEN", 60, supports_vision=True, timeout=120, max_connections=5)
         self.base_url = "https://api-inference.huggingface.co/models"
 
     async def generate(self, prompt: str, image_base64: Optional[str] = None) -> str:
@@ -157,13 +256,13 @@ class HuggingFaceProvider(LLMProvider):
 
         payload = {"inputs": prompt, "parameters": {"max_new_tokens": 4096}}
 
-        async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(url, json=payload, headers=headers)
-            resp.raise_for_status()
-            data = resp.json()
-            if isinstance(data, list) and len(data) > 0:
-                return data[0].get("generated_text", "")
-            return str(data)
+        client = self.get_client()
+        resp = await client.post(url, json=payload, headers=headers)
+        resp.raise_for_status()
+        data = resp.json()
+        if isinstance(data, list) and len(data) > 0:
+            return data[0].get("generated_text", "")
+        return str(data)
 
 
 class LLMRouter:
@@ -176,35 +275,143 @@ class LLMRouter:
             HuggingFaceProvider(),
         ]
         self._retry_after = 0
+        self.cache = LLMResponseCache()
+
+    async def generate(
+        self,
+        prompt: str,
+        image_base64: Optional[str] = None,
+        require_vision: bool = False,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        cache_scope: Optional[str] = None,
+    ) -> str:
+        cache_key = None
+        if cache_scope:
+            cache_key = make_cache_key(prompt, image_base64, require_vision)
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"LLM cache hit ({cache_scope})")
+                return cached
 
-    async def generate(self, prompt: str, image_base64: Optional[str] = None, require_vision: bool = False) -> str:
         if time.time() < self._retry_after:
             wait_time = self._retry_after - time.time()
             logger.info(f"All providers rate-limited, waiting {wait_time:.0f}s")
             await self._async_sleep(wait_time)
 
-        for provider in self.providers:
-            if require_vision and not provider.supports_vision:
-                continue
-            if not provider.can_make_request():
-                continue
+        providers = self.rank_providers(require_vision)
+        if hedge:
+            delay = LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay
+            result = await self._generate_hedged(providers, prompt, image_base64, delay)
+        else:
+            result = await self._generate_sequential(providers, prompt, image_base64)
 
-            try:
-                logger.info(f"Using LLM provider: {provider.name}")
-                provider.record_request()
-                result = await provider.generate(prompt, image_base64)
-                if result:
-                    return result
-            except Exception as e:
-                logger.warning(f"Provider {provider.name} failed: {e}")
-                continue
+        if result:
+            if cache_key:
+                await self.cache.set(cache_key, result, self.cache.ttl_for(cache_scope))
+            return result
 
-        logger.warning("All providers exhausted, queuing retry in 60s")
-        self._retry_after = time.time() + 60
+        self._retry_after = self._next_slot_at(require_vision)
+        logger.warning(f"All providers exhausted, next slot in {self._retry_after - time.time():.0f}s")
         raise Exception("All LLM providers are rate-limited or unavailable")
 
+    async def _generate_sequential(self, providers: list, prompt: str, image_base64: Optional[str]) -> str:
+        remaining = iter(providers)
+        while True:
+            provider = await self._next_available(remaining)
+            if provider is None:
+                return ""
+            result = await self._call_provider(provider, prompt, image_base64)
+            if result:
+                return result
+
+    async def _generate_hedged(self, providers: list, prompt: str, image_base64: Optional[str], hedge_delay: float) -> str:
+        remaining = iter(providers)
+        pending = set()
+
+        async def launch() -> bool:
+            provider = await self._next_available(remaining)
+            if provider is None:
+                return False
+            pending.add(asyncio.create_task(self._call_provider(provider, prompt, image_base64)))
+            return True
+
+        await launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if len(pending) < LLM_HEDGE_MAX_IN_FLIGHT and await launch():
+                        logger.info(f"No LLM answer after {hedge_delay:.1f}s, hedging to a second provider")
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    result = task.result()
+                    if result:
+                        return result
+
+                if len(pending) < LLM_HEDGE_MAX_IN_FLIGHT:
+                    await launch()
+            return ""
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _next_available(self, remaining) -> Optional[LLMProvider]:
+        for provider in remaining:
+            if provider.can_make_request() and await provider.acquire_request_slot():
+                return provider
+        return None
+
+    def _next_slot_at(self, require_vision: bool = False) -> float:
+        slots = [
+            max(provider.next_slot_at(), provider.circuit_open_until)
+            for provider in self.providers
+            if provider.is_available and (provider.supports_vision or not require_vision)
+        ]
+        if not slots:
+            return time.time() + 60
+        return min(slots)
+
+    async def _call_provider(self, provider: LLMProvider, prompt: str, image_base64: Optional[str]) -> str:
+        try:
+            logger.info(f"Using LLM provider: {provider.name}")
+            started = time.monotonic()
+            result = await provider.generate(prompt, image_base64)
+            if result:
+                provider.record_success(time.monotonic() - started)
+                return result
+            provider.record_failure(empty=True)
+        except Exception as e:
+            provider.record_failure()
+            logger.warning(f"Provider {provider.name} failed: {e}")
+        return ""
+
+    def rank_providers(self, require_vision: bool = False) -> list:
+        candidates = [
+            (index, provider)
+            for index, provider in enumerate(self.providers)
+            if (provider.supports_vision or not require_vision) and not provider.is_circuit_open()
+        ]
+        candidates.sort(key=lambda item: (item[1].expected_latency(), item[0]))
+        return [provider for _, provider in candidates]
+
+    def health(self) -> dict:
+        return {provider.name: provider.health() for provider in self.providers}
+
+    async def close(self):
+        for provider in self.providers:
+            try:
+                await provider.close()
+            except Exception as e:
+                logger.warning(f"Failed to close client for {provider.name}: {e}")
+        await self.cache.close()
+        await close_rate_limiter()
+
     async def _async_sleep(self, seconds):
-        import asyncio
         await asyncio.sleep(seconds)
 
 
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from redis import asyncio as aioredis
+
+from .utils.selector_probe import find_first_visible
+
+logger = logging.getLogger(__name__)
+
+SELECTORS_DIR = os.getenv("SELECTOR_CACHE_DIR", "/tmp/automateflow_selectors")
+SELECTOR_CACHE_REDIS_URL = os.getenv("SELECTOR_CACHE_REDIS_URL", "")
+REDIS_KEY_PREFIX = "automateflow:selectors:"
+# Re-read a domain after this long so selectors learned by other workers show up.
+SELECTOR_CACHE_REFRESH = 300
+
+_domains = {}
+_loaded_at = {}
+_redis_client = None
+
+
+def get_domain(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None and SELECTOR_CACHE_REDIS_URL:
+        _redis_client = aioredis.from_url(SELECTOR_CACHE_REDIS_URL, decode_responses=True)
+    return _redis_client
+
+
+def get_domain_path(domain: str) -> str:
+    os.makedirs(SELECTORS_DIR, exist_ok=True)
+    return os.path.join(SELECTORS_DIR, f"{domain}.json")
+
+
+def _read_local(domain: str) -> dict:
+    path = get_domain_path(domain)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed to read selector cache for {domain}: {e}")
+        return {}
+
+
+def _write_local(domain: str, selectors: dict):
+    path = get_domain_path(domain)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(selectors, f)
+    os.replace(tmp_path, path)
+
+
+async def _load_domain(domain: str) -> dict:
+    if domain not in _domains or time.monotonic() - _loaded_at[domain] > SELECTOR_CACHE_REFRESH:
+        selectors = await asyncio.to_thread(_read_local, domain)
+        client = get_redis_client()
+        if client is not None:
+            try:
+                selectors.update(await client.hgetall(REDIS_KEY_PREFIX + domain))
+            except Exception as e:
+                logger.warning(f"Failed to read shared selector cache for {domain}: {e}")
+        _domains[domain] = selectors
+        _loaded_at[domain] = time.monotonic()
+    return _domains[domain]
+
+
+async def get_learned_selector(url: str, field: str) -> Optional[str]:
+    domain = get_domain(url)
+    if not domain:
+        return None
+    selectors = await _load_domain(domain)
+    return selectors.get(field)
+
+
+async def remember_selector(url: str, field: str, selector: str):
+    domain = get_domain(url)
+    if not domain or not selector:
+        return
+    selectors = await _load_domain(domain)
+    if selectors.get(field) == selector:
+        return
+    selectors[field] = selector
+
+    try:
+        await asyncio.to_thread(_write_local, domain, dict(selectors))
+    except Exception as e:
+        logger.warning(f"Failed to save selector cache for {domain}: {e}")
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            await client.hset(REDIS_KEY_PREFIX + domain, field, selector)
+        except Exception as e:
+            logger.warning(f"Failed to write shared selector cache for {domain}: {e}")
+    logger.info(f"Learned selector for {domain} {field}: {selector}")
+
+
+async def forget_selector(url: str, field: str):
+    domain = get_domain(url)
+    if not domain:
+        return
+    selectors = await _load_domain(domain)
+    if selectors.pop(field, None) is None:
+        return
+
+    try:
+        await asyncio.to_thread(_write_local, domain, dict(selectors))
+    except Exception as e:
+        logger.warning(f"Failed to save selector cache for {domain}: {e}")
+
+    client = get_redis_client()
+    if client is not None:
+        try:
+            await client.hdel(REDIS_KEY_PREFIX + domain, field)
+        except Exception as e:
+            logger.warning(f"Failed to update shared selector cache for {domain}: {e}")
+
+
+async def find_visible(page, url: str, field: str, candidates: list) -> Optional[Tuple[object, str]]:
+    learned = await get_learned_selector(url, field)
+    ordered = [learned] + [c for c in candidates if c != learned] if learned else list(candidates)
+
+    match = await find_first_visible(page, ordered)
+    if match:
+        selector, tag = match
+        element = await page.query_selector(selector)
+        if element:
+            await remember_selector(url, field, selector)
+            return element, tag
+
+    if learned:
+        await forget_selector(url, field)
+    return None
+
+
+async def close_redis_client():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
@@ -1,51 +1,201 @@
-import os
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
 from typing import Optional
+from urllib.parse import urlparse
+
+from redis import asyncio as aioredis
 
 logger = logging.getLogger(__name__)
 
-SESSIONS_DIR = "/tmp/automateflow_sessions"
+SESSION_STORE = os.getenv("SESSION_STORE", "local")
+SESSIONS_DIR = os.getenv("SESSIONS_DIR", "/tmp/automateflow_sessions")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "") or os.getenv("REDIS_URL", "redis://localhost:6379")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 86400)))
+REDIS_KEY_PREFIX = "automateflow:session:"
+
+# Set per job by the worker so sessions are never shared between users.
+session_owner: ContextVar[str] = ContextVar("session_owner", default="")
+
+# Replays saved localStorage for the origins in a storage_state. Runs before
+# any page script, which is as close as an existing context gets to passing
+# storage_state into new_context().
+RESTORE_STORAGE_JS = """
+((origins) => {
+    const saved = origins[window.location.origin];
+    if (!saved) return;
+    try {
+        for (const { name, value } of saved) {
+            if (window.localStorage.getItem(name) === null) {
+                window.localStorage.setItem(name, value);
+            }
+        }
+    } catch (e) {}
+})(%s);
+"""
+
+
+def make_session_key(url: str, account: Optional[str] = None) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    domain = host[4:] if host.startswith("www.") else host
+    # Hash the owner and account so usernames never show up in key names.
+    identity = f"{session_owner.get()}\0{account or 'default'}"
+    return f"{domain}:{hashlib.sha256(identity.encode('utf-8')).hexdigest()[:24]}"
+
+
+def encode_state(state: dict) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decode_state(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, data: bytes, ttl: int):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class LocalSessionStore(SessionStore):
+    def __init__(self, directory: str = SESSIONS_DIR):
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{key.replace(':', '_')}.session")
 
+    def _read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at = float(f.readline())
+                data = f.read()
+        except (OSError, ValueError):
+            return None
+        if time.time() >= expires_at:
+            self._remove(key)
+            return None
+        return data
 
-def ensure_sessions_dir():
-    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    def _write(self, key: str, data: bytes, ttl: int):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(f"{time.time() + ttl}\n".encode("ascii"))
+            f.write(data)
+        os.replace(tmp_path, path)
 
+    def _remove(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
 
-def get_session_path(job_id: str) -> str:
-    ensure_sessions_dir()
-    return os.path.join(SESSIONS_DIR, f"{job_id}_cookies.json")
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
 
+    async def set(self, key: str, data: bytes, ttl: int):
+        await asyncio.to_thread(self._write, key, data, ttl)
 
-async def save_session(context, job_id: str):
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._remove, key)
+
+
+class RedisSessionStore(SessionStore):
+    def __init__(self, redis_url: str = SESSION_REDIS_URL):
+        self.client = aioredis.from_url(redis_url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(REDIS_KEY_PREFIX + key)
+
+    async def set(self, key: str, data: bytes, ttl: int):
+        await self.client.set(REDIS_KEY_PREFIX + key, data, ex=ttl)
+
+    async def delete(self, key: str):
+        await self.client.delete(REDIS_KEY_PREFIX + key)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+SESSION_STORES = {
+    "local": LocalSessionStore,
+    "redis": RedisSessionStore,
+}
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        if SESSION_STORE not in SESSION_STORES:
+            raise ValueError(f"Unknown session store: {SESSION_STORE}")
+        _store = SESSION_STORES[SESSION_STORE]()
+    return _store
+
+
+async def close_session_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
+
+
+async def save_session(context, session_key: str, ttl: int = SESSION_TTL):
     try:
-        cookies = await context.cookies()
-        session_path = get_session_path(job_id)
-        with open(session_path, "w") as f:
-            json.dump(cookies, f)
-        logger.info(f"Saved session for job {job_id}: {len(cookies)} cookies")
+        state = await context.storage_state()
+        data = encode_state(state)
+        await get_session_store().set(session_key, data, ttl)
+        logger.info(
+            f"Saved session {session_key}: {len(state.get('cookies', []))} cookies, "
+            f"{len(state.get('origins', []))} origins ({len(data)} bytes)"
+        )
     except Exception as e:
-        logger.warning(f"Failed to save session for job {job_id}: {e}")
+        logger.warning(f"Failed to save session {session_key}: {e}")
 
 
-async def load_session(context, job_id: str) -> bool:
-    session_path = get_session_path(job_id)
-    if not os.path.exists(session_path):
-        return False
-
+async def load_session(context, session_key: str) -> bool:
     try:
-        with open(session_path, "r") as f:
-            cookies = json.load(f)
-        await context.add_cookies(cookies)
-        logger.info(f"Loaded session for job {job_id}: {len(cookies)} cookies")
+        data = await get_session_store().get(session_key)
+        if data is None:
+            return False
+        state = decode_state(data)
+        cookies = state.get("cookies", [])
+        if cookies:
+            await context.add_cookies(cookies)
+        origins = {o["origin"]: o.get("localStorage", []) for o in state.get("origins", [])}
+        if origins:
+            await context.add_init_script(RESTORE_STORAGE_JS % json.dumps(origins))
+        logger.info(f"Loaded session {session_key}: {len(cookies)} cookies, {len(origins)} origins")
         return True
     except Exception as e:
-        logger.warning(f"Failed to load session for job {job_id}: {e}")
+        logger.warning(f"Failed to load session {session_key}: {e}")
         return False
 
 
-def clear_session(job_id: str):
-    session_path = get_session_path(job_id)
-    if os.path.exists(session_path):
-        os.remove(session_path)
-        logger.info(f"Cleared session for job {job_id}")
+async def clear_session(session_key: str):
+    try:
+        await get_session_store().delete(session_key)
+        logger.info(f"Cleared session {session_key}")
+    except Exception as e:
+        logger.warning(f"Failed to clear session {session_key}: {e}")
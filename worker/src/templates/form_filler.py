@@ -3,8 +3,11 @@ import logging
 from typing import Dict, Any
 
 from ..browser_manager import browser_manager
-from ..utils.anti_detection import apply_stealth
+from ..utils.readiness import wait_until_ready
 from ..llm_router import llm_router
+from ..utils.page_distiller import distill_page
+from ..utils.selector_probe import find_first_visible
+from ..selector_cache import find_visible, remember_selector, forget_selector
 
 logger = logging.getLogger(__name__)
 
@@ -19,9 +22,8 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     if not field_values:
         raise ValueError("fieldValues is required")
 
-    context = await browser_manager.create_context(job_id)
+    context = await browser_manager.create_context(job_id, network_profile="lean")
     page = await context.new_page()
-    await apply_stealth(page)
 
     screenshot_task = await browser_manager.run_with_screenshots(
         page, job_id, callback_fn, interval=3.0
@@ -30,7 +32,7 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     try:
         await callback_fn(logs=["Navigating to form page..."])
         await page.goto(form_url, wait_until="domcontentloaded", timeout=30000)
-        await asyncio.sleep(2)
+        await wait_until_ready(page, selector="input, textarea, select", timeout=10)
 
         filled_fields = []
         failed_fields = []
@@ -50,38 +52,33 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
             ]
 
             filled = False
-            for selector in selectors:
+            match = await find_visible(page, form_url, f"field:{field_name}", selectors)
+            if match:
+                element, tag = match
                 try:
-                    element = await page.query_selector(selector)
-                    if element:
-                        is_visible = await element.is_visible()
-                        if not is_visible:
-                            continue
-
-                        tag = await element.evaluate("el => el.tagName.toLowerCase()")
-                        if tag == "select":
-                            await element.select_option(value=str(field_value))
-                        else:
-                            await element.click()
-                            await element.fill(str(field_value))
+                    if tag == "select":
+                        await element.select_option(value=str(field_value))
+                    else:
+                        await element.click()
+                        await element.fill(str(field_value))
 
-                        filled_fields.append(field_name)
-                        filled = True
-                        break
+                    filled_fields.append(field_name)
+                    filled = True
                 except Exception as e:
-                    logger.debug(f"Selector {selector} failed: {e}")
-                    continue
+                    logger.debug(f"Filling {field_name} failed: {e}")
+                    # Visible but not fillable: don't keep steering later jobs to it.
+                    await forget_selector(form_url, f"field:{field_name}")
 
             if not filled:
                 try:
-                    page_content = await page.content()
-                    prompt = f"""Given this HTML form, find the CSS selector for the input field that corresponds to "{field_name}".
+                    page_summary = await distill_page(page, max_chars=3000)
+                    prompt = f"""Given this form page, find the CSS selector for the input field that corresponds to "{field_name}".
 Return ONLY the CSS selector, nothing else.
 
-HTML (first 3000 chars):
-{page_content[:3000]}"""
+Page content:
+{page_summary}"""
 
-                    selector = await llm_router.generate(prompt)
+                    selector = await llm_router.generate(prompt, cache_scope="form_filler")
                     selector = selector.strip().strip('"').strip("'").strip("`")
 
                     element = await page.query_selector(selector)
@@ -90,6 +87,7 @@ HTML (first 3000 chars):
                         await element.fill(str(field_value))
                         filled_fields.append(field_name)
                         filled = True
+                        await remember_selector(form_url, f"field:{field_name}", selector)
                 except Exception as e:
                     logger.warning(f"LLM-assisted fill failed for {field_name}: {e}")
 
@@ -97,8 +95,6 @@ HTML (first 3000 chars):
                 failed_fields.append(field_name)
                 await callback_fn(logs=[f"Could not find field: {field_name}"])
 
-            await asyncio.sleep(0.5)
-
         if should_submit:
             await callback_fn(logs=["Submitting form..."])
             submit_selectors = [
@@ -110,16 +106,14 @@ HTML (first 3000 chars):
             ]
 
             submitted = False
-            for selector in submit_selectors:
+            match = await find_first_visible(page, submit_selectors)
+            if match:
                 try:
-                    btn = await page.query_selector(selector)
-                    if btn:
-                        await btn.click()
-                        submitted = True
-                        await asyncio.sleep(2)
-                        break
-                except Exception:
-                    continue
+                    await page.click(match[0], timeout=10000)
+                    submitted = True
+                    await wait_until_ready(page, timeout=10)
+                except Exception as e:
+                    logger.debug(f"Submit click failed: {e}")
 
             if not submitted:
                 await callback_fn(logs=["Could not find submit button"])
@@ -139,4 +133,4 @@ HTML (first 3000 chars):
             await screenshot_task
         except asyncio.CancelledError:
             pass
-        await context.close()
+        await browser_manager.release_context(context)
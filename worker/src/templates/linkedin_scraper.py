@@ -3,9 +3,10 @@ import logging
 from typing import Dict, Any
 
 from ..browser_manager import browser_manager
-from ..utils.anti_detection import apply_stealth
+from ..utils.readiness import wait_until_ready
 from ..llm_router import llm_router
-from ..session_manager import save_session
+from ..utils.page_distiller import distill_page
+from ..session_manager import save_session, make_session_key
 
 logger = logging.getLogger(__name__)
 
@@ -15,9 +16,9 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     if not profile_url:
         raise ValueError("profileUrl is required")
 
-    context = await browser_manager.create_context(job_id)
+    session_key = make_session_key(profile_url, parameters.get("account"))
+    context = await browser_manager.create_context(job_id, network_profile="lean", session_key=session_key)
     page = await context.new_page()
-    await apply_stealth(page)
 
     screenshot_task = await browser_manager.run_with_screenshots(
         page, job_id, callback_fn, interval=3.0
@@ -26,14 +27,14 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     try:
         await callback_fn(logs=["Navigating to LinkedIn profile..."])
         await page.goto(profile_url, wait_until="domcontentloaded", timeout=30000)
-        await asyncio.sleep(3)
+        await wait_until_ready(page, timeout=10)
 
         await callback_fn(logs=["Extracting profile data..."])
 
-        page_content = await page.content()
+        page_summary = await distill_page(page, max_chars=5000)
         screenshot_b64 = await browser_manager.take_screenshot_base64(page)
 
-        prompt = f"""Extract the following information from this LinkedIn profile page HTML.
+        prompt = f"""Extract the following information from this LinkedIn profile page.
 Return a valid JSON object with these fields:
 - name: string
 - headline: string
@@ -45,10 +46,12 @@ Return a valid JSON object with these fields:
 If a field is not found, use null or empty array.
 Only return the JSON, no other text.
 
-HTML content (first 5000 chars):
-{page_content[:5000]}"""
+Page content:
+{page_summary}"""
 
-        result_text = await llm_router.generate(prompt, image_base64=screenshot_b64, require_vision=True)
+        result_text = await llm_router.generate(
+            prompt, image_base64=screenshot_b64, require_vision=True, cache_scope="linkedin_scraper"
+        )
 
         import json
         try:
@@ -61,7 +64,7 @@ HTML content (first 5000 chars):
         except json.JSONDecodeError:
             result = {"raw_text": result_text}
 
-        await save_session(context, job_id)
+        await save_session(context, session_key)
         await callback_fn(logs=["Profile data extracted successfully"])
 
         return result
@@ -72,4 +75,4 @@ HTML content (first 5000 chars):
             await screenshot_task
         except asyncio.CancelledError:
             pass
-        await context.close()
+        await browser_manager.release_context(context)
@@ -3,14 +3,27 @@ import logging
 from typing import Dict, Any
 
 from ..browser_manager import browser_manager
-from ..utils.anti_detection import apply_stealth
+from ..utils.readiness import wait_until_ready
 from ..llm_router import llm_router
-from ..session_manager import save_session
+from ..utils.page_distiller import distill_page
+from ..session_manager import save_session, make_session_key
+from ..selector_cache import find_visible, get_learned_selector
+from ..utils.selector_probe import find_first_visible
 from ..utils.storage import upload_file
 
 logger = logging.getLogger(__name__)
 
 
+async def _login_form_visible(page, portal_url: str, login_selectors: Dict[str, list]) -> bool:
+    candidates = []
+    for field in ("username", "password"):
+        learned = await get_learned_selector(portal_url, f"login:{field}")
+        if learned:
+            candidates.append(learned)
+        candidates.extend(login_selectors[field])
+    return await find_first_visible(page, candidates) is not None
+
+
 async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str, Any]:
     portal_url = parameters.get("portalUrl")
     login_credentials = parameters.get("loginCredentials", {})
@@ -26,9 +39,9 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     username = login_credentials.get("username", "")
     password = login_credentials.get("password", "")
 
-    context = await browser_manager.create_context(job_id)
+    session_key = make_session_key(portal_url, username)
+    context = await browser_manager.create_context(job_id, session_key=session_key)
     page = await context.new_page()
-    await apply_stealth(page)
 
     screenshot_task = await browser_manager.run_with_screenshots(
         page, job_id, callback_fn, interval=3.0
@@ -37,9 +50,10 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     try:
         await callback_fn(logs=["Navigating to portal..."])
         await page.goto(portal_url, wait_until="domcontentloaded", timeout=30000)
-        await asyncio.sleep(2)
-
-        await callback_fn(logs=["Attempting login..."])
+        session_restored = browser_manager.session_restored(context)
+        # A logged-in page may have no inputs at all, so only wait for the
+        # login form when there is no session to fall back on.
+        await wait_until_ready(page, selector=None if session_restored else "input", timeout=10)
 
         login_selectors = {
             "username": [
@@ -58,48 +72,44 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
             ],
         }
 
-        for selector in login_selectors["username"]:
-            try:
-                el = await page.query_selector(selector)
-                if el and await el.is_visible():
-                    await el.fill(username)
-                    await callback_fn(logs=["Username entered"])
-                    break
-            except Exception:
-                continue
-
-        for selector in login_selectors["password"]:
-            try:
-                el = await page.query_selector(selector)
-                if el and await el.is_visible():
-                    await el.fill(password)
-                    await callback_fn(logs=["Password entered"])
-                    break
-            except Exception:
-                continue
-
-        submit_selectors = [
-            'button[type="submit"]',
-            'input[type="submit"]',
-            'button:has-text("Login")',
-            'button:has-text("Sign in")',
-            'button:has-text("Log in")',
-        ]
-
-        for selector in submit_selectors:
-            try:
-                btn = await page.query_selector(selector)
-                if btn and await btn.is_visible():
-                    await btn.click()
-                    break
-            except Exception:
-                continue
-
-        await asyncio.sleep(3)
-        await save_session(context, job_id)
-        await callback_fn(logs=["Login attempted, searching for invoice..."])
-
-        page_content = await page.content()
+        # A restored session lands past the login form; only log in when the
+        # portal still asks for credentials.
+        if session_restored and not await _login_form_visible(page, portal_url, login_selectors):
+            await callback_fn(logs=["Reusing saved session, skipping login"])
+        else:
+            await callback_fn(logs=["Attempting login..."])
+
+            match = await find_visible(page, portal_url, "login:username", login_selectors["username"])
+            if match:
+                await match[0].fill(username)
+                await callback_fn(logs=["Username entered"])
+
+            match = await find_visible(page, portal_url, "login:password", login_selectors["password"])
+            if match:
+                await match[0].fill(password)
+                await callback_fn(logs=["Password entered"])
+
+            submit_selectors = [
+                'button[type="submit"]',
+                'input[type="submit"]',
+                'button:has-text("Login")',
+                'button:has-text("Sign in")',
+                'button:has-text("Log in")',
+            ]
+
+            match = await find_visible(page, portal_url, "login:submit", submit_selectors)
+            if match:
+                try:
+                    await match[0].click()
+                except Exception as e:
+                    logger.debug(f"Login submit click failed: {e}")
+
+            await wait_until_ready(page, timeout=15)
+            await save_session(context, session_key)
+
+        await callback_fn(logs=["Searching for invoice..."])
+
+        page_summary = await distill_page(page, max_chars=5000)
         screenshot_b64 = await browser_manager.take_screenshot_base64(page)
 
         prompt = f"""I need to find and download an invoice with identifier "{invoice_identifier}" from this portal.
@@ -112,10 +122,12 @@ Return a JSON with:
 - "invoiceLink": direct link to invoice if visible (or null)
 - "nextSteps": description of what to do next
 
-HTML (first 5000 chars):
-{page_content[:5000]}"""
+Page content:
+{page_summary}"""
 
-        result_text = await llm_router.generate(prompt, image_base64=screenshot_b64, require_vision=True)
+        result_text = await llm_router.generate(
+            prompt, image_base64=screenshot_b64, require_vision=True, cache_scope="pdf_invoice_downloader"
+        )
 
         import json
         try:
@@ -135,7 +147,7 @@ HTML (first 5000 chars):
                 if search_el:
                     await search_el.fill(invoice_identifier)
                     await page.keyboard.press("Enter")
-                    await asyncio.sleep(3)
+                    await wait_until_ready(page, timeout=10)
                     await callback_fn(logs=[f"Searched for invoice: {invoice_identifier}"])
             except Exception as e:
                 logger.warning(f"Search failed: {e}")
@@ -150,14 +162,9 @@ HTML (first 5000 chars):
                     'button:has-text("Download")',
                     'a:has-text("Download")',
                 ]
-                for selector in download_triggers:
-                    try:
-                        el = await page.query_selector(selector)
-                        if el and await el.is_visible():
-                            await el.click()
-                            break
-                    except Exception:
-                        continue
+                match = await find_first_visible(page, download_triggers)
+                if match:
+                    await page.click(match[0], timeout=10000)
             except Exception:
                 pass
 
@@ -167,7 +174,7 @@ HTML (first 5000 chars):
             if file_path:
                 with open(file_path, "rb") as f:
                     file_bytes = f.read()
-                pdf_url = upload_file(file_bytes, job_id, f"invoice_{invoice_identifier}.pdf", "application/pdf")
+                pdf_url = await upload_file(file_bytes, job_id, f"invoice_{invoice_identifier}.pdf", "application/pdf")
                 await callback_fn(logs=[f"Invoice downloaded: {pdf_url}"])
         except Exception as e:
             logger.warning(f"Download handling failed: {e}")
@@ -186,4 +193,4 @@ HTML (first 5000 chars):
             await screenshot_task
         except asyncio.CancelledError:
             pass
-        await context.close()
+        await browser_manager.release_context(context)
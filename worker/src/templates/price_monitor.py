@@ -1,41 +1,29 @@
 import asyncio
+import json
 import logging
 import re
 from typing import Dict, Any
 
 from ..browser_manager import browser_manager
-from ..utils.anti_detection import apply_stealth
+from ..utils.readiness import wait_until_ready
 from ..llm_router import llm_router
+from ..utils.page_distiller import extract_page_data, format_page_data
+from ..utils.price_extractor import extract_price, parse_price
+from ..utils.batch import get_batch_items, get_batch_concurrency, run_batch
 
 logger = logging.getLogger(__name__)
 
 
-async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str, Any]:
-    product_url = parameters.get("productUrl")
-    target_price = parameters.get("targetPrice")
-
-    if not product_url:
-        raise ValueError("productUrl is required")
-    if target_price is None:
-        raise ValueError("targetPrice is required")
-
-    target_price = float(target_price)
-    context = await browser_manager.create_context(job_id)
-    page = await context.new_page()
-    await apply_stealth(page)
-
-    screenshot_task = await browser_manager.run_with_screenshots(
-        page, job_id, callback_fn, interval=3.0
-    )
-
-    try:
-        await callback_fn(logs=["Navigating to product page..."])
-        await page.goto(product_url, wait_until="domcontentloaded", timeout=30000)
-        await asyncio.sleep(3)
+async def check_price(page, product_url: str, target_price: float) -> Dict[str, Any]:
+    await page.goto(product_url, wait_until="domcontentloaded", timeout=30000)
+    await wait_until_ready(page, timeout=10)
 
-        await callback_fn(logs=["Extracting price information..."])
+    page_data = await extract_page_data(page)
+    price_data = extract_price(page_data)
+    from_structured_data = price_data is not None
 
-        page_content = await page.content()
+    if not price_data:
+        page_summary = format_page_data(page_data, max_chars=5000)
         screenshot_b64 = await browser_manager.take_screenshot_base64(page)
 
         prompt = f"""Look at this product page and extract the current price.
@@ -48,12 +36,13 @@ Return ONLY a JSON object with these fields:
 
 Only return the JSON, no other text.
 
-HTML content (first 5000 chars):
-{page_content[:5000]}"""
+Page content:
+{page_summary}"""
 
-        result_text = await llm_router.generate(prompt, image_base64=screenshot_b64, require_vision=True)
+        result_text = await llm_router.generate(
+            prompt, image_base64=screenshot_b64, require_vision=True, hedge=True, cache_scope="price_monitor"
+        )
 
-        import json
         try:
             start = result_text.find("{")
             end = result_text.rfind("}") + 1
@@ -64,20 +53,95 @@ HTML content (first 5000 chars):
         except json.JSONDecodeError:
             price_data = {"currentPrice": None, "productName": "Unknown"}
 
-        current_price = price_data.get("currentPrice")
-        is_below = False
-        if current_price is not None:
-            is_below = float(current_price) <= target_price
+    # A zero or missing price (e.g. "price on request") must not raise an alert.
+    current_price = parse_price(price_data.get("currentPrice"))
+    price_data["currentPrice"] = current_price
+    is_below = current_price is not None and current_price <= target_price
 
-        result = {
-            **price_data,
-            "targetPrice": target_price,
-            "isBelowTarget": is_below,
-            "url": product_url,
-        }
+    return {
+        **price_data,
+        "extractionMethod": "structured_data" if from_structured_data else "llm",
+        "targetPrice": target_price,
+        "isBelowTarget": is_below,
+        "url": product_url,
+    }
+
+
+def parse_target_price(value: Any, url: str) -> float:
+    # The create-job form pre-fills targetPrice with "", which means unset.
+    if value is None or value == "":
+        raise ValueError(f"targetPrice is required for {url}")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"targetPrice must be a number for {url}, got {value!r}") from None
+
+
+def _price_status(result: Dict[str, Any]) -> str:
+    below = "BELOW" if result["isBelowTarget"] else "ABOVE"
+    return f"Current price: {result.get('currentPrice')} (target: {result['targetPrice']}) - {below} target"
+
+
+async def run_batch_check(
+    products: list, default_target: Any, parameters: Dict[str, Any], job_id: str, callback_fn
+) -> Dict[str, Any]:
+    checks = []
+    for product in products:
+        if isinstance(product, dict):
+            url, target = product.get("url") or product.get("productUrl"), product.get("targetPrice", default_target)
+        else:
+            url, target = product, default_target
+        if not url:
+            raise ValueError("Every entry in productUrls needs a url")
+        checks.append((url, parse_target_price(target, url)))
+
+    concurrency = get_batch_concurrency(parameters, len(checks))
+    context = await browser_manager.create_context(job_id, network_profile="lean")
+    try:
+        await callback_fn(logs=[f"Checking {len(checks)} products, {concurrency} at a time..."])
+        summary = await run_batch(
+            context,
+            checks,
+            lambda page, check: check_price(page, *check),
+            callback_fn,
+            concurrency,
+            describe=lambda check: check[0],
+        )
+        summary["belowTarget"] = sum(1 for item in summary["items"] if item.get("isBelowTarget"))
+        await callback_fn(logs=[
+            f"Checked {summary['total']} products: {summary['succeeded']} succeeded, "
+            f"{summary['failed']} failed, {summary['belowTarget']} below target"
+        ])
+        return summary
+    finally:
+        await browser_manager.release_context(context)
+
+
+async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str, Any]:
+    product_url = parameters.get("productUrl")
+    products = get_batch_items(parameters, "productUrls")
+    target_price = parameters.get("targetPrice")
+
+    if products is not None:
+        return await run_batch_check(products, target_price, parameters, job_id, callback_fn)
+
+    if not product_url:
+        raise ValueError("productUrl or productUrls is required")
+    target_price = parse_target_price(target_price, product_url)
+    context = await browser_manager.create_context(job_id, network_profile="lean")
+    page = await context.new_page()
+
+    screenshot_task = await browser_manager.run_with_screenshots(
+        page, job_id, callback_fn, interval=3.0
+    )
+
+    try:
+        await callback_fn(logs=["Navigating to product page..."])
+        result = await check_price(page, product_url, target_price)
 
-        status_msg = f"Current price: {current_price} (target: {target_price}) - {'BELOW' if is_below else 'ABOVE'} target"
-        await callback_fn(logs=[status_msg])
+        if result["extractionMethod"] == "structured_data":
+            await callback_fn(logs=["Price found in structured page data"])
+        await callback_fn(logs=[_price_status(result)])
 
         return result
 
@@ -87,4 +151,4 @@ HTML content (first 5000 chars):
             await screenshot_task
         except asyncio.CancelledError:
             pass
-        await context.close()
+        await browser_manager.release_context(context)
@@ -1,18 +1,26 @@
-import asyncio
 import logging
 from typing import Dict, Any
 
 from ..browser_manager import browser_manager
-from ..utils.anti_detection import apply_stealth
-from ..utils.storage import upload_screenshot
+from ..utils.readiness import wait_until_ready
+from ..utils.batch import get_batch_items, get_batch_concurrency, run_batch
 
 logger = logging.getLogger(__name__)
 
 
+async def capture_url(page, url: str, job_id: str, full_page: bool) -> str:
+    await page.goto(url, wait_until="networkidle", timeout=30000)
+    await wait_until_ready(page, quiet_ms=1000, timeout=5)
+
+    screenshot_bytes, encoding = await browser_manager.capture_screenshot(page, "artifact", full_page=full_page)
+    return await browser_manager.upload_capture(screenshot_bytes, encoding, job_id)
+
+
 async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str, Any]:
     url = parameters.get("url")
-    if not url:
-        raise ValueError("url is required")
+    urls = get_batch_items(parameters, "urls")
+    if not url and urls is None:
+        raise ValueError("url or urls is required")
 
     viewport = parameters.get("viewport", {"width": 1920, "height": 1080})
     full_page = parameters.get("fullPage", False)
@@ -20,22 +28,37 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
     width = viewport.get("width", 1920) if isinstance(viewport, dict) else 1920
     height = viewport.get("height", 1080) if isinstance(viewport, dict) else 1080
 
-    context = await browser_manager.browser.new_context(
-        viewport={"width": width, "height": height},
-        locale="en-US",
-    )
+    context = await browser_manager.create_context(job_id, network_profile="full")
+
+    if urls is not None:
+        try:
+            concurrency = get_batch_concurrency(parameters, len(urls))
+            await callback_fn(logs=[f"Capturing {len(urls)} pages, {concurrency} at a time..."])
+
+            async def process(page, batch_url):
+                screenshot_url = await capture_url(page, batch_url, job_id, full_page)
+                await callback_fn(screenshots=[screenshot_url])
+                return {"url": batch_url, "screenshotUrl": screenshot_url}
+
+            async def setup_page(page):
+                await page.set_viewport_size({"width": width, "height": height})
+
+            summary = await run_batch(context, urls, process, callback_fn, concurrency, setup_page=setup_page)
+            await callback_fn(logs=[f"Captured {summary['succeeded']} of {summary['total']} pages"])
+            return {
+                **summary,
+                "viewport": {"width": width, "height": height},
+                "fullPage": full_page,
+            }
+        finally:
+            await browser_manager.release_context(context)
+
     page = await context.new_page()
-    await apply_stealth(page)
+    await page.set_viewport_size({"width": width, "height": height})
 
     try:
         await callback_fn(logs=[f"Navigating to {url}..."])
-        await page.goto(url, wait_until="networkidle", timeout=30000)
-        await asyncio.sleep(2)
-
-        await callback_fn(logs=["Taking screenshot..."])
-        screenshot_bytes = await page.screenshot(full_page=full_page)
-
-        screenshot_url = upload_screenshot(screenshot_bytes, job_id)
+        screenshot_url = await capture_url(page, url, job_id, full_page)
         await callback_fn(
             logs=["Screenshot captured successfully"],
             screenshots=[screenshot_url],
@@ -49,4 +72,4 @@ async def run(parameters: Dict[str, Any], job_id: str, callback_fn) -> Dict[str,
         }
 
     finally:
-        await context.close()
+        await browser_manager.release_context(context)
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+
+def get_batch_items(parameters: Dict[str, Any], key: str) -> Optional[List[Any]]:
+    items = parameters.get(key)
+    # The create-job form pre-fills every schema property with "".
+    if items is None or items == "" or items == []:
+        return None
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"{key} must be a non-empty list")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f"{key} accepts at most {BATCH_MAX_ITEMS} entries")
+    return items
+
+
+def get_batch_concurrency(parameters: Dict[str, Any], item_count: int) -> int:
+    try:
+        requested = int(parameters.get("concurrency") or BATCH_CONCURRENCY)
+    except (TypeError, ValueError):
+        requested = BATCH_CONCURRENCY
+    return max(1, min(requested, BATCH_CONCURRENCY, item_count))
+
+
+# Runs process_fn over items using a fixed set of pages from one context. Each
+# finished item is streamed through callback_fn as soon as it is done, and the
+# aggregate comes back in input order.
+async def run_batch(
+    context,
+    items: List[Any],
+    process_fn: Callable[[Any, Any], Awaitable[Dict[str, Any]]],
+    callback_fn,
+    concurrency: int,
+    describe: Callable[[Any], str] = str,
+    setup_page: Optional[Callable[[Any], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for index, item in enumerate(items):
+        queue.put_nowait((index, item))
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    completed = 0
+
+    async def worker():
+        nonlocal completed
+        page = await context.new_page()
+        try:
+            if setup_page is not None:
+                await setup_page(page)
+            while True:
+                try:
+                    index, item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    entry = {**await process_fn(page, item), "success": True}
+                    message = f"{describe(item)}: done"
+                except Exception as e:
+                    logger.warning(f"Batch item {describe(item)} failed: {e}")
+                    entry = {"url": describe(item), "success": False, "error": str(e)}
+                    message = f"{describe(item)}: failed ({e})"
+                results[index] = entry
+                completed += 1
+                await callback_fn(logs=[f"[{completed}/{len(items)}] {message}"], results=[entry])
+        finally:
+            try:
+                await page.close()
+            except Exception as e:
+                logger.debug(f"Failed to close batch page: {e}")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    succeeded = sum(1 for entry in results if entry and entry["success"])
+    return {
+        "items": results,
+        "total": len(items),
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+    }
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "false").lower() == "true"
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "/tmp/automateflow_http_cache")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+HTTP_CACHE_MAX_ENTRY_BYTES = int(os.getenv("HTTP_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+
+CACHEABLE_RESOURCE_TYPES = {"script", "stylesheet", "font", "image"}
+# The body we store is already decoded, so encoding and framing headers
+# from the origin response no longer apply when replaying it.
+STRIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+# Freshness heuristic for responses with Last-Modified but no explicit
+# lifetime (RFC 9111 4.2.2), capped at a day.
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX_AGE = 86400
+
+
+def make_cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def parse_cache_control(value: str) -> dict:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else True
+    return directives
+
+
+def _parse_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def freshness_lifetime(headers: dict) -> Optional[int]:
+    directives = parse_cache_control(headers.get("cache-control", ""))
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    # This cache is shared by every context, so s-maxage wins over max-age.
+    for name in ("s-maxage", "max-age"):
+        seconds = _parse_int(directives.get(name))
+        if seconds is not None:
+            return max(seconds, 0)
+
+    expires = _parse_date(headers.get("expires"))
+    if "expires" in headers:
+        if expires is None:
+            return 0
+        date = _parse_date(headers.get("date")) or time.time()
+        return max(int(expires - date), 0)
+
+    last_modified = _parse_date(headers.get("last-modified"))
+    if last_modified is not None:
+        return min(int((time.time() - last_modified) * HEURISTIC_FRACTION), HEURISTIC_MAX_AGE)
+    if headers.get("etag"):
+        return 0
+    return None
+
+
+def is_storable(status: int, headers: dict, credentialed: bool = False) -> bool:
+    if status != 200 or "set-cookie" in headers:
+        return False
+    # Entries are shared across every tenant's contexts, so a response to a
+    # request carrying cookies or auth is only kept when marked public.
+    if credentialed and "public" not in parse_cache_control(headers.get("cache-control", "")):
+        return False
+    vary = {v.strip().lower() for v in headers.get("vary", "").split(",") if v.strip()}
+    # We key on URL alone, so only accept variants we can ignore safely.
+    return vary <= {"accept-encoding", "origin"}
+
+
+async def has_credentials(request) -> bool:
+    try:
+        headers = await request.all_headers()
+    except Exception:
+        headers = request.headers
+    if "cookie" in headers or "authorization" in headers:
+        return True
+    # Cookies may be attached below the route layer; ask the context too.
+    try:
+        return bool(await request.frame.page.context.cookies(request.url))
+    except Exception:
+        return False
+
+
+class HttpCache:
+    def __init__(self, directory: str = HTTP_CACHE_DIR, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.body")
+
+    def _scan(self) -> list:
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                # Left behind by a worker that died mid-write.
+                os.remove(os.path.join(self.directory, name))
+                continue
+            if not name.endswith(".json"):
+                continue
+            key = name[:-5]
+            try:
+                with open(self._meta_path(key), "r") as f:
+                    meta = json.load(f)
+                found.append((os.path.getmtime(self._body_path(key)), key, meta))
+            except (OSError, ValueError):
+                self._remove_files(key)
+        # Oldest access first so the in-memory order matches LRU order.
+        return sorted(found)
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                for _, key, meta in await asyncio.to_thread(self._scan):
+                    self.entries[key] = meta
+                    self.size_bytes += meta["size"]
+                logger.info(f"HTTP cache loaded {len(self.entries)} entries ({self.size_bytes / 1024 / 1024:.1f}MB)")
+            except Exception as e:
+                logger.warning(f"Failed to load HTTP cache from {self.directory}: {e}")
+            self._loaded = True
+        await self._evict_to_fit()
+
+    def _remove_files(self, key: str):
+        for path in (self._meta_path(key), self._body_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _write_files(self, key: str, meta: dict, body: Optional[bytes]):
+        if body is not None:
+            tmp_path = f"{self._body_path(key)}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, self._body_path(key))
+        tmp_path = f"{self._meta_path(key)}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path(key))
+
+    def _read_body(self, key: str) -> bytes:
+        path = self._body_path(key)
+        with open(path, "rb") as f:
+            body = f.read()
+        # Touch the body so LRU order survives a worker restart.
+        os.utime(path)
+        return body
+
+    def _forget(self, key: str):
+        meta = self.entries.pop(key, None)
+        if meta is not None:
+            self.size_bytes -= meta["size"]
+
+    async def _evict_to_fit(self):
+        while self.size_bytes > self.max_bytes and self.entries:
+            key, _ = next(iter(self.entries.items()))
+            self._forget(key)
+            self.evictions += 1
+            await asyncio.to_thread(self._remove_files, key)
+
+    async def _store(self, key: str, url: str, status: int, headers: dict, body: bytes, lifetime: int):
+        if len(body) > HTTP_CACHE_MAX_ENTRY_BYTES:
+            return
+        meta = {
+            "url": url,
+            "status": status,
+            "headers": {k: v for k, v in headers.items() if k not in STRIPPED_HEADERS},
+            "etag": headers.get("etag"),
+            "lastModified": headers.get("last-modified"),
+            "expiresAt": time.time() + lifetime,
+            "size": len(body),
+        }
+        try:
+            await asyncio.to_thread(self._write_files, key, meta, body)
+        except Exception as e:
+            logger.debug(f"Failed to write HTTP cache entry for {url}: {e}")
+            return
+        self._forget(key)
+        self.entries[key] = meta
+        self.size_bytes += meta["size"]
+        self.stored += 1
+        await self._evict_to_fit()
+
+    async def _serve(self, route, key: str, meta: dict) -> bool:
+        # Evictions can run while we await; mark the entry recently used
+        # before reading so it isn't the next one to go, and bail out if it
+        # is already gone so the caller fetches from the network instead.
+        if key not in self.entries:
+            return False
+        self.entries.move_to_end(key)
+        try:
+            body = await asyncio.to_thread(self._read_body, key)
+        except OSError:
+            self._forget(key)
+            return False
+        self.bytes_served += len(body)
+        await route.fulfill(status=meta["status"], headers=meta["headers"], body=body)
+        return True
+
+    async def handle(self, route):
+        request = route.request
+        if (
+            request.method != "GET"
+            or request.resource_type not in CACHEABLE_RESOURCE_TYPES
+            or not request.url.startswith(("http://", "https://"))
+            or "range" in request.headers
+        ):
+            await route.fallback()
+            return
+
+        await self._ensure_loaded()
+        key = make_cache_key(request.url)
+        meta = self.entries.get(key)
+
+        if meta is not None and time.time() < meta["expiresAt"]:
+            if await self._serve(route, key, meta):
+                self.hits += 1
+                return
+            meta = None
+
+        headers = dict(request.headers)
+        if meta is not None:
+            if meta.get("etag"):
+                headers["if-none-match"] = meta["etag"]
+            if meta.get("lastModified"):
+                headers["if-modified-since"] = meta["lastModified"]
+
+        try:
+            response = await route.fetch(headers=headers)
+        except Exception as e:
+            logger.debug(f"HTTP cache fetch failed for {request.url}: {e}")
+            await route.fallback()
+            return
+
+        response_headers = {k.lower(): v for k, v in response.headers.items()}
+        if response.status == 304 and meta is not None:
+            lifetime = freshness_lifetime(response_headers)
+            meta["expiresAt"] = time.time() + (lifetime or 0)
+            for name in ("cache-control", "expires", "etag", "last-modified", "date"):
+                if name in response_headers:
+                    meta["headers"][name] = response_headers[name]
+            meta["etag"] = meta["headers"].get("etag")
+            meta["lastModified"] = meta["headers"].get("last-modified")
+            if key in self.entries:
+                try:
+                    await asyncio.to_thread(self._write_files, key, meta, None)
+                except Exception as e:
+                    logger.debug(f"Failed to refresh HTTP cache entry for {request.url}: {e}")
+            if await self._serve(route, key, meta):
+                self.revalidated += 1
+                return
+            response = await route.fetch()
+            response_headers = {k.lower(): v for k, v in response.headers.items()}
+
+        self.misses += 1
+        body = await response.body()
+        lifetime = freshness_lifetime(response_headers)
+        credentialed = await has_credentials(request)
+        if lifetime is not None and is_storable(response.status, response_headers, credentialed):
+            await self._store(key, request.url, response.status, response_headers, body, lifetime)
+        elif meta is not None:
+            self._forget(key)
+            await asyncio.to_thread(self._remove_files, key)
+        await route.fulfill(response=response, body=body)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.revalidated + self.misses
+        return {
+            "entries": len(self.entries),
+            "sizeBytes": self.size_bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "stored": self.stored,
+            "evictions": self.evictions,
+            "bytesServed": self.bytes_served,
+            "hitRate": round((self.hits + self.revalidated) / requests, 3) if requests else 0.0,
+        }
+
+
+http_cache: Optional[HttpCache] = HttpCache() if HTTP_CACHE_ENABLED else None
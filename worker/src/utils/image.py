@@ -0,0 +1,92 @@
+import io
+import os
+from typing import Optional
+
+from PIL import Image
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+EXTENSIONS = {"PNG": "png", "JPEG": "jpg", "WEBP": "webp"}
+
+
+class EncodingProfile:
+    def __init__(self, image_format: str = "PNG", quality: Optional[int] = None, max_dimension: Optional[int] = None, grayscale: bool = False):
+        self.format = image_format.upper()
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+    def needs_reencode(self) -> bool:
+        # Chromium can emit PNG and JPEG itself; anything else goes through Pillow.
+        return self.format == "WEBP" or self.max_dimension is not None or self.grayscale
+
+
+def _profile_from_env(prefix: str, image_format: str, quality: Optional[int], max_dimension: Optional[int]) -> EncodingProfile:
+    quality_env = os.getenv(f"{prefix}_QUALITY")
+    max_dim_env = os.getenv(f"{prefix}_MAX_DIM")
+    return EncodingProfile(
+        image_format=os.getenv(f"{prefix}_FORMAT", image_format),
+        quality=int(quality_env) if quality_env else quality,
+        max_dimension=int(max_dim_env) if max_dim_env else max_dimension,
+        grayscale=os.getenv(f"{prefix}_GRAYSCALE", "false").lower() == "true",
+    )
+
+
+ENCODING_PROFILES = {
+    "preview": _profile_from_env("PREVIEW_IMAGE", "JPEG", 60, 1280),
+    "llm": _profile_from_env("LLM_IMAGE", "JPEG", 75, 1280),
+    "artifact": EncodingProfile("PNG"),
+}
+
+
+def encode_image(image_bytes: bytes, profile: EncodingProfile) -> bytes:
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        if profile.grayscale:
+            image = image.convert("L")
+        elif profile.format in ("JPEG", "WEBP") and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        if profile.max_dimension and max(image.size) > profile.max_dimension:
+            image.thumbnail((profile.max_dimension, profile.max_dimension), Image.LANCZOS)
+
+        output = io.BytesIO()
+        options = {"quality": profile.quality} if profile.quality and profile.format != "PNG" else {}
+        if profile.format == "PNG":
+            options["optimize"] = True
+        image.save(output, format=profile.format, **options)
+        return output.getvalue()
+
+
+def image_mime_type(image_base64: str) -> str:
+    if image_base64.startswith("/9j/"):
+        return "image/jpeg"
+    if image_base64.startswith("UklGR"):
+        return "image/webp"
+    return "image/png"
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    # 64-bit difference hash: compare neighbouring pixels of a 9x8 grayscale
+    # thumbnail, which ignores compression noise but catches layout changes.
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        thumb = image.convert("L").resize((9, 8), Image.BILINEAR)
+        pixels = list(thumb.getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hash_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
@@ -0,0 +1,94 @@
+import logging
+import os
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+TRACKER_DOMAINS = {
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "analytics.tiktok.com",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "segment.io",
+    "segment.com",
+    "mixpanel.com",
+    "amplitude.com",
+    "optimizely.com",
+    "newrelic.com",
+    "nr-data.net",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "adsrvr.org",
+    "fullstory.com",
+}
+
+PROFILES = {
+    "full": {"block_types": set(), "block_trackers": False},
+    "lean": {"block_types": {"image", "font", "media"}, "block_trackers": True},
+    "text": {"block_types": {"image", "font", "media", "stylesheet"}, "block_trackers": True},
+}
+
+
+def _parse_domains(value: str) -> set:
+    return {d.strip().lower() for d in value.split(",") if d.strip()}
+
+
+NETWORK_ALLOW_DOMAINS = _parse_domains(os.getenv("NETWORK_ALLOW_DOMAINS", ""))
+NETWORK_DENY_DOMAINS = _parse_domains(os.getenv("NETWORK_DENY_DOMAINS", ""))
+
+
+def _matches(host: str, domains: set) -> bool:
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class RequestFilter:
+    def __init__(self, profile: str = "full", allow_domains: set = None, deny_domains: set = None):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown network profile: {profile}")
+        self.profile = profile
+        self.block_types = PROFILES[profile]["block_types"]
+        self.block_trackers = PROFILES[profile]["block_trackers"]
+        self.allow_domains = NETWORK_ALLOW_DOMAINS | (allow_domains or set())
+        self.deny_domains = NETWORK_DENY_DOMAINS | (deny_domains or set())
+        self.blocked_requests = 0
+        self.blocked_by_type = {}
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.block_types or self.block_trackers or self.deny_domains)
+
+    def should_block(self, url: str, resource_type: str) -> bool:
+        host = (urlparse(url).hostname or "").lower()
+        if _matches(host, self.deny_domains):
+            return True
+        if _matches(host, self.allow_domains):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return self.block_trackers and _matches(host, TRACKER_DOMAINS)
+
+    async def handle(self, route):
+        request = route.request
+        if self.should_block(request.url, request.resource_type):
+            self.blocked_requests += 1
+            self.blocked_by_type[request.resource_type] = self.blocked_by_type.get(request.resource_type, 0) + 1
+            await route.abort("blockedbyclient")
+            return
+        await route.fallback()
+
+    def stats(self) -> dict:
+        return {
+            "profile": self.profile,
+            "blockedRequests": self.blocked_requests,
+            "blockedByType": dict(self.blocked_by_type),
+        }
@@ -0,0 +1,139 @@
+import json
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Runs in the page in a single round-trip. innerText already skips script,
+# style, template and hidden nodes, so only rendered text reaches the prompt.
+DISTILL_JS = """
+(maxElements) => {
+    const clean = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+
+    const cssEscape = (s) => (window.CSS && CSS.escape) ? CSS.escape(s) : s.replace(/["\\\\]/g, '\\\\$&');
+
+    const selectorFor = (el) => {
+        if (el.id) return '#' + cssEscape(el.id);
+        const tag = el.tagName.toLowerCase();
+        const name = el.getAttribute('name');
+        if (name) return `${tag}[name="${name.replace(/"/g, '\\\\"')}"]`;
+        const parts = [];
+        let node = el;
+        while (node && node.nodeType === 1 && node !== document.body && parts.length < 5) {
+            let part = node.tagName.toLowerCase();
+            if (node.id) {
+                parts.unshift('#' + cssEscape(node.id));
+                break;
+            }
+            const parent = node.parentElement;
+            if (parent) {
+                const siblings = Array.from(parent.children).filter(c => c.tagName === node.tagName);
+                if (siblings.length > 1) part += `:nth-of-type(${siblings.indexOf(node) + 1})`;
+            }
+            parts.unshift(part);
+            node = parent;
+        }
+        return parts.join(' > ');
+    };
+
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        if (rect.width === 0 && rect.height === 0) return false;
+        const style = getComputedStyle(el);
+        return style.visibility !== 'hidden' && style.display !== 'none';
+    };
+
+    const labelFor = (el) => {
+        if (el.labels && el.labels.length) return clean(el.labels[0].innerText);
+        return clean(el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.getAttribute('title'));
+    };
+
+    const structured = [];
+    document.querySelectorAll('script[type="application/ld+json"]').forEach((s) => {
+        try { structured.push(JSON.parse(s.textContent)); } catch (e) {}
+    });
+
+    const meta = {};
+    document.querySelectorAll('meta[property], meta[name]').forEach((m) => {
+        const key = m.getAttribute('property') || m.getAttribute('name');
+        if (/^(og:|product:|twitter:|description$)/.test(key)) meta[key] = m.getAttribute('content');
+    });
+    document.querySelectorAll('[itemprop]').forEach((el) => {
+        const key = 'itemprop:' + el.getAttribute('itemprop');
+        if (key in meta) return;
+        meta[key] = el.getAttribute('content') || el.getAttribute('value') || clean(el.innerText).slice(0, 200);
+    });
+
+    const elements = [];
+    const interactive = document.querySelectorAll(
+        'input:not([type="hidden"]), textarea, select, button, a[href], [role="button"], [contenteditable="true"]'
+    );
+    for (const el of interactive) {
+        if (elements.length >= maxElements) break;
+        if (!isVisible(el)) continue;
+        const tag = el.tagName.toLowerCase();
+        const entry = { tag, selector: selectorFor(el) };
+        const type = el.getAttribute('type');
+        if (type) entry.type = type;
+        const label = labelFor(el);
+        if (label) entry.label = label.slice(0, 80);
+        const text = (tag === 'button' || tag === 'a') ? clean(el.innerText).slice(0, 80) : '';
+        if (text) entry.text = text;
+        if (tag === 'a') entry.href = el.getAttribute('href');
+        if (tag === 'select') entry.options = Array.from(el.options).slice(0, 10).map(o => clean(o.text));
+        elements.push(entry);
+    }
+
+    const text = document.body ? clean(document.body.innerText) : '';
+
+    return {
+        url: location.href,
+        title: document.title,
+        structuredData: structured,
+        meta,
+        elements,
+        text,
+    };
+}
+"""
+
+
+async def extract_page_data(page, max_elements: int = 150) -> Dict[str, Any]:
+    try:
+        return await page.evaluate(DISTILL_JS, max_elements)
+    except Exception as e:
+        logger.warning(f"Page distillation failed: {e}")
+        return {"url": page.url, "title": "", "structuredData": [], "meta": {}, "elements": [], "text": ""}
+
+
+def format_page_data(data: Dict[str, Any], max_chars: int = 5000) -> str:
+    sections = [f"URL: {data.get('url', '')}", f"Title: {data.get('title', '')}"]
+
+    if data.get("structuredData"):
+        structured = json.dumps(data["structuredData"], separators=(",", ":"))
+        sections.append("Structured data (JSON-LD):\n" + structured[: max_chars // 4])
+
+    if data.get("meta"):
+        meta = "\n".join(f"{k}: {v}" for k, v in data["meta"].items() if v)
+        sections.append("Meta:\n" + meta[: max_chars // 8])
+
+    if data.get("elements"):
+        lines = []
+        for el in data["elements"]:
+            details = " ".join(
+                f'{key}="{el[key]}"' for key in ("type", "label", "text", "href") if el.get(key)
+            )
+            options = f" options={el['options']}" if el.get("options") else ""
+            lines.append(f"- {el['tag']} {el['selector']} {details}{options}".rstrip())
+        sections.append("Interactive elements:\n" + "\n".join(lines)[: max_chars // 3])
+
+    summary = "\n\n".join(sections)
+    remaining = max_chars - len(summary) - len("\n\nVisible text:\n")
+    if remaining > 0 and data.get("text"):
+        summary += "\n\nVisible text:\n" + data["text"][:remaining]
+    return summary[:max_chars]
+
+
+async def distill_page(page, max_chars: int = 5000) -> str:
+    data = await extract_page_data(page)
+    return format_page_data(data, max_chars)
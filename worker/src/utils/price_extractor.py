@@ -0,0 +1,145 @@
+import re
+from typing import Any, Dict, Iterator, Optional
+
+IN_STOCK_MARKERS = ("instock", "in stock", "limitedavailability", "onlineonly", "instoreonly", "presale", "preorder")
+OUT_OF_STOCK_MARKERS = ("outofstock", "out of stock", "soldout", "discontinued", "oos")
+# Where the page's own product lives, versus lists of related products.
+PRIMARY_KEYS = ("@graph", "mainEntity")
+LIST_KEYS = PRIMARY_KEYS + ("itemListElement", "item")
+
+
+def parse_price(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # Zero usually means "price on request"; let the caller fall back.
+        return float(value) if value > 0 else None
+
+    # Ranges ("10 - 20") or several numbers can't be reduced to one price.
+    groups = re.findall(r"\d[\d.,]*\d|\d", str(value))
+    if len(groups) != 1:
+        return None
+    text = groups[0]
+    if re.fullmatch(r"\d+\.\d{3}", text):
+        # "1.234" is 1234 in many locales; too ambiguous for the fast path.
+        return None
+    if "," in text and "." in text:
+        # Whichever separator comes last is the decimal point.
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text:
+        whole, _, fraction = text.rpartition(",")
+        text = f"{whole.replace(',', '')}.{fraction}" if len(fraction) in (1, 2) else text.replace(",", "")
+    try:
+        price = float(text)
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+
+def parse_availability(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    text = str(value).lower().replace("_", "").replace("-", "")
+    if any(marker in text for marker in OUT_OF_STOCK_MARKERS):
+        return False
+    if any(marker in text for marker in IN_STOCK_MARKERS):
+        return True
+    return None
+
+
+def _iter_nodes(node: Any, keys: tuple = LIST_KEYS) -> Iterator[Dict[str, Any]]:
+    if isinstance(node, list):
+        for item in node:
+            yield from _iter_nodes(item, keys)
+    elif isinstance(node, dict):
+        yield node
+        for key in keys:
+            if key in node:
+                yield from _iter_nodes(node[key], keys)
+
+
+def _has_type(node: Dict[str, Any], type_name: str) -> bool:
+    node_type = node.get("@type")
+    types = node_type if isinstance(node_type, list) else [node_type]
+    return any(isinstance(t, str) and t.split("/")[-1] == type_name for t in types)
+
+
+def _first(value: Any) -> Any:
+    return value[0] if isinstance(value, list) and value else value
+
+
+def _from_offer(offer: Dict[str, Any]) -> Dict[str, Any]:
+    price = offer.get("price", offer.get("lowPrice"))
+    currency = offer.get("priceCurrency")
+    spec = _first(offer.get("priceSpecification"))
+    if price is None and isinstance(spec, dict):
+        price = spec.get("price")
+        currency = currency or spec.get("priceCurrency")
+    return {
+        "currentPrice": parse_price(price),
+        "currency": currency,
+        "originalPrice": None,
+        "inStock": parse_availability(offer.get("availability")),
+    }
+
+
+def _from_json_ld(structured_data: list) -> Optional[Dict[str, Any]]:
+    # Related-product lists often come first; only use them when the page
+    # has no priced Product of its own.
+    return _from_products(_iter_nodes(structured_data, PRIMARY_KEYS)) or _from_products(_iter_nodes(structured_data))
+
+
+def _from_products(nodes: Iterator[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    for node in nodes:
+        if not _has_type(node, "Product"):
+            continue
+        offers = node.get("offers")
+        offer_list = offers if isinstance(offers, list) else [offers]
+        for offer in offer_list:
+            if not isinstance(offer, dict):
+                continue
+            for candidate in [offer] + [o for o in _iter_nodes(offer.get("offers")) if o is not offer]:
+                result = _from_offer(candidate)
+                if result["currentPrice"] is not None:
+                    name = _first(node.get("name"))
+                    return {"productName": name, **result}
+    return None
+
+
+def _from_meta(meta: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    price = None
+    for key in ("itemprop:price", "product:price:amount", "og:price:amount", "itemprop:lowPrice"):
+        price = parse_price(meta.get(key))
+        if price is not None:
+            break
+    if price is None:
+        return None
+
+    currency = meta.get("itemprop:priceCurrency") or meta.get("product:price:currency") or meta.get("og:price:currency")
+    availability = meta.get("itemprop:availability") or meta.get("product:availability") or meta.get("og:availability")
+    name = meta.get("itemprop:name") or meta.get("og:title")
+    return {
+        "productName": name,
+        "currentPrice": price,
+        "currency": currency,
+        "originalPrice": None,
+        "inStock": parse_availability(availability),
+    }
+
+
+def extract_price(page_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    result = _from_json_ld(page_data.get("structuredData") or [])
+    if result is None:
+        result = _from_meta(page_data.get("meta") or {})
+    if result is None:
+        return None
+
+    if not result.get("productName"):
+        result["productName"] = page_data.get("title") or "Unknown"
+    if result.get("inStock") is None:
+        # Schema.org offers without availability are conventionally purchasable.
+        result["inStock"] = True
+    return result
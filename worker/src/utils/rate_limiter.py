@@ -0,0 +1,97 @@
+import logging
+import os
+import time
+
+from redis import asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_REDIS_URL = os.getenv("LLM_RATE_LIMIT_REDIS_URL", "")
+REDIS_KEY_PREFIX = "automateflow:ratelimit:"
+
+# Refill and take one token atomically using the Redis server clock, so every
+# worker shares one bucket regardless of local clock skew.
+# Returns {allowed, seconds_until_next_token}.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+return {allowed, tostring(wait)}
+"""
+
+_redis_client = None
+
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None and RATE_LIMIT_REDIS_URL:
+        _redis_client = aioredis.from_url(RATE_LIMIT_REDIS_URL)
+    return _redis_client
+
+
+async def close_redis_client():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate_per_min: float):
+        self.name = name
+        self.capacity = float(rate_per_min)
+        self.rate = rate_per_min / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.next_slot_at = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def has_capacity(self) -> bool:
+        if time.time() < self.next_slot_at:
+            return False
+        self._refill()
+        return self.tokens >= 1
+
+    def seconds_until_available(self) -> float:
+        self._refill()
+        local_wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(local_wait, self.next_slot_at - time.time(), 0.0)
+
+    async def try_acquire(self) -> bool:
+        client = get_redis_client()
+        if client is not None:
+            try:
+                allowed, wait = await client.eval(
+                    TOKEN_BUCKET_LUA, 1, REDIS_KEY_PREFIX + self.name, self.capacity, self.rate
+                )
+                wait = float(wait)
+                self.next_slot_at = time.time() + wait
+                return bool(allowed)
+            except Exception as e:
+                logger.warning(f"Shared rate limiter unavailable for {self.name}, using local bucket: {e}")
+
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
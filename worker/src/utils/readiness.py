@@ -0,0 +1,126 @@
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Installed on every context: counts in-flight fetch/XHR so readiness checks
+# can tell when the page has stopped loading data.
+REQUEST_TRACKER_JS = """
+(() => {
+    if (window.__afInflight) return;
+    const inflight = new Map();
+    let nextId = 0;
+    window.__afInflight = inflight;
+
+    const track = () => {
+        const id = nextId++;
+        inflight.set(id, performance.now());
+        return () => inflight.delete(id);
+    };
+
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function (...args) {
+            const done = track();
+            return originalFetch.apply(this, args).finally(done);
+        };
+    }
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        const done = track();
+        this.addEventListener('loadend', done, { once: true });
+        return originalSend.apply(this, args);
+    };
+})();
+"""
+
+# Resolves once the DOM has been quiet for quietMs, no fetch/XHR younger than
+# longPollMs is in flight and the optional selector is attached, or when
+# timeoutMs runs out. Attribute changes are ignored: carousels and tickers
+# rewrite style/class forever and would otherwise keep every wait at its cap.
+READY_JS = """
+(opts) => new Promise((resolve) => {
+    const start = performance.now();
+    let lastMutation = start;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, { childList: true, subtree: true, characterData: true });
+
+    const selectorAttached = () => {
+        if (!opts.selector) return true;
+        try {
+            return !!document.querySelector(opts.selector);
+        } catch (e) {
+            return true;
+        }
+    };
+
+    const pendingRequests = (now) => {
+        const inflight = window.__afInflight;
+        if (!inflight) return 0;
+        let count = 0;
+        for (const started of inflight.values()) {
+            if (now - started < opts.longPollMs) count++;
+        }
+        return count;
+    };
+
+    const check = () => {
+        const now = performance.now();
+        const pending = pendingRequests(now);
+        const ready = now - lastMutation >= opts.quietMs && pending === 0 && selectorAttached();
+        const timedOut = now - start >= opts.timeoutMs;
+        if (ready || timedOut) {
+            observer.disconnect();
+            resolve({ waitedMs: now - start, timedOut: !ready, pending });
+            return;
+        }
+        setTimeout(check, 50);
+    };
+    check();
+})
+"""
+
+
+async def wait_until_ready(
+    page,
+    selector: Optional[str] = None,
+    quiet_ms: int = 500,
+    timeout: float = 10.0,
+    long_poll_ms: int = 5000,
+) -> float:
+    started = time.monotonic()
+    deadline = started + timeout
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            # An action may have kicked off a navigation; let it commit first.
+            await page.wait_for_load_state("domcontentloaded", timeout=remaining * 1000)
+            remaining = deadline - time.monotonic()
+            result = await page.evaluate(
+                READY_JS,
+                {
+                    "selector": selector,
+                    "quietMs": quiet_ms,
+                    "timeoutMs": max(remaining, 0) * 1000,
+                    "longPollMs": long_poll_ms,
+                },
+            )
+            if result.get("timedOut"):
+                logger.debug(f"Readiness wait hit {timeout}s cap ({result.get('pending')} requests pending)")
+            break
+        except Exception as e:
+            # Navigation destroyed the execution context mid-wait: try again
+            # on the new document within the same budget.
+            if "context was destroyed" in str(e) or "navigation" in str(e).lower():
+                continue
+            logger.debug(f"Readiness wait failed: {e}")
+            break
+
+    waited = time.monotonic() - started
+    logger.debug(f"Page ready after {waited:.2f}s")
+    return waited
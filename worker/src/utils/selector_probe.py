@@ -0,0 +1,49 @@
+import logging
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mirrors Playwright's visibility rule: a non-empty bounding box and not
+# visibility:hidden. Selectors the browser can't parse (Playwright-only
+# pseudo-classes such as :has-text) come back flagged as unsupported.
+PROBE_JS = """
+(selectors) => selectors.map((selector) => {
+    let el;
+    try {
+        el = document.querySelector(selector);
+    } catch (e) {
+        return { selector, supported: false, found: false, visible: false, tag: null };
+    }
+    if (!el) return { selector, supported: true, found: false, visible: false, tag: null };
+    const rect = el.getBoundingClientRect();
+    const style = getComputedStyle(el);
+    const visible = rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden';
+    return { selector, supported: true, found: true, visible, tag: el.tagName.toLowerCase() };
+})
+"""
+
+
+async def probe_selectors(page, selectors: List[str]) -> List[dict]:
+    try:
+        return await page.evaluate(PROBE_JS, selectors)
+    except Exception as e:
+        logger.debug(f"Selector probe failed: {e}")
+        return [{"selector": s, "supported": False, "found": False, "visible": False, "tag": None} for s in selectors]
+
+
+async def find_first_visible(page, selectors: List[str]) -> Optional[Tuple[str, str]]:
+    for result in await probe_selectors(page, selectors):
+        if result["supported"]:
+            if result["visible"]:
+                return result["selector"], result["tag"]
+            continue
+
+        # Playwright-specific selector: fall back to the handle round-trips.
+        try:
+            element = await page.query_selector(result["selector"])
+            if element and await element.is_visible():
+                tag = await element.evaluate("el => el.tagName.toLowerCase()")
+                return result["selector"], tag
+        except Exception:
+            continue
+    return None
@@ -1,13 +1,24 @@
+import asyncio
 import os
+import time
 import uuid
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 import boto3
 from botocore.config import Config
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "32"))
+UPLOAD_MAX_ATTEMPTS = 3
+
 s3_client = None
+upload_executor: Optional[ThreadPoolExecutor] = None
+upload_slots: Optional[asyncio.Semaphore] = None
+pending_uploads = set()
 
 
 def get_s3_client():
@@ -28,40 +39,99 @@ def get_bucket():
     return os.getenv("IDRIVE_E2_BUCKET", "automateflow-files")
 
 
-def upload_screenshot(screenshot_bytes: bytes, job_id: str) -> str:
+def build_url(key: str) -> str:
+    endpoint = os.getenv("IDRIVE_E2_ENDPOINT", "")
+    return f"{endpoint}/{get_bucket()}/{key}"
+
+
+def put_object(key: str, body: bytes, content_type: str):
     client = get_s3_client()
-    bucket = get_bucket()
-    key = f"screenshots/{job_id}/{uuid.uuid4()}.png"
+    for attempt in range(1, UPLOAD_MAX_ATTEMPTS + 1):
+        try:
+            client.put_object(
+                Bucket=get_bucket(),
+                Key=key,
+                Body=body,
+                ContentType=content_type,
+                ACL="public-read",
+            )
+            return
+        except Exception as e:
+            if attempt == UPLOAD_MAX_ATTEMPTS:
+                raise
+            delay = 0.5 * (2 ** (attempt - 1))
+            logger.warning(f"Upload of {key} failed (attempt {attempt}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
 
-    client.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=screenshot_bytes,
-        ContentType="image/png",
-        ACL="public-read",
-    )
 
-    endpoint = os.getenv("IDRIVE_E2_ENDPOINT", "")
-    url = f"{endpoint}/{bucket}/{key}"
-    logger.info(f"Uploaded screenshot: {url}")
+def get_upload_executor() -> ThreadPoolExecutor:
+    global upload_executor
+    if upload_executor is None:
+        upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+    return upload_executor
+
+
+def get_upload_slots() -> asyncio.Semaphore:
+    global upload_slots
+    if upload_slots is None:
+        upload_slots = asyncio.Semaphore(UPLOAD_QUEUE_SIZE)
+    return upload_slots
+
+
+async def enqueue_upload(key: str, body: bytes, content_type: str) -> asyncio.Future:
+    # Waits only when UPLOAD_QUEUE_SIZE uploads are already queued or in flight,
+    # which pushes back on producers instead of buffering without bound.
+    slots = get_upload_slots()
+    await slots.acquire()
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_upload_executor(), put_object, key, body, content_type)
+    pending_uploads.add(future)
+
+    def on_done(f):
+        slots.release()
+        pending_uploads.discard(f)
+        if not f.cancelled() and f.exception() is not None:
+            logger.error(f"Upload of {key} failed: {f.exception()}")
+
+    future.add_done_callback(on_done)
+    return future
+
+
+async def upload_screenshot(
+    screenshot_bytes: bytes,
+    job_id: str,
+    wait: bool = True,
+    content_type: str = "image/png",
+    extension: str = "png",
+) -> str:
+    key = f"screenshots/{job_id}/{uuid.uuid4()}.{extension}"
+    future = await enqueue_upload(key, screenshot_bytes, content_type)
+    url = build_url(key)
+    if wait:
+        await future
+        logger.info(f"Uploaded screenshot: {url}")
     return url
 
 
-def upload_file(file_bytes: bytes, job_id: str, filename: str, content_type: str = "application/octet-stream") -> str:
-    client = get_s3_client()
-    bucket = get_bucket()
+async def upload_file(
+    file_bytes: bytes,
+    job_id: str,
+    filename: str,
+    content_type: str = "application/octet-stream",
+    wait: bool = True,
+) -> str:
     ext = filename.rsplit(".", 1)[-1] if "." in filename else "bin"
     key = f"results/{job_id}/{uuid.uuid4()}.{ext}"
+    future = await enqueue_upload(key, file_bytes, content_type)
+    url = build_url(key)
+    if wait:
+        await future
+        logger.info(f"Uploaded file: {url}")
+    return url
 
-    client.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=file_bytes,
-        ContentType=content_type,
-        ACL="public-read",
-    )
 
-    endpoint = os.getenv("IDRIVE_E2_ENDPOINT", "")
-    url = f"{endpoint}/{bucket}/{key}"
-    logger.info(f"Uploaded file: {url}")
-    return url
+async def drain_uploads():
+    if pending_uploads:
+        logger.info(f"Waiting for {len(pending_uploads)} pending upload(s)")
+        await asyncio.gather(*list(pending_uploads), return_exceptions=True)
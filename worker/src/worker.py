@@ -5,6 +5,8 @@ import time
 import logging
 import signal
 import sys
+from contextlib import asynccontextmanager
+from typing import Optional
 
 from dotenv import load_dotenv
 
@@ -17,18 +19,23 @@ setup_logging()
 logger = logging.getLogger(__name__)
 
 import redis
+from redis import asyncio as aioredis
 import httpx
 
 from .browser_manager import browser_manager
 from .llm_router import llm_router
-from .handoff import check_for_handoff
-from .utils.anti_detection import apply_stealth
-from .session_manager import save_session
+from .utils.readiness import wait_until_ready
+from .handoff import HandoffWatcher, wait_for_handoff_resolution, close_redis_client as close_handoff_redis
+from .session_manager import save_session, load_session, make_session_key, session_owner, close_session_store
+from .selector_cache import close_redis_client as close_selector_cache
+from .callback_buffer import CallbackBuffer
+from .utils.storage import drain_uploads
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:3000")
 WORKER_SECRET = os.getenv("WORKER_SECRET", "")
 QUEUE_NAME = "automation-jobs"
+WORKER_CONCURRENCY = max(1, int(os.getenv("WORKER_CONCURRENCY", "4")))
 
 TEMPLATE_MAP = {
     "linkedin_scraper": "templates.linkedin_scraper",
@@ -38,7 +45,11 @@ TEMPLATE_MAP = {
     "pdf_invoice_downloader": "templates.pdf_invoice_downloader",
 }
 
+HANDOFF_TIMEOUT = int(os.getenv("HANDOFF_TIMEOUT", "300"))
+
 shutdown_event = asyncio.Event()
+job_slots: Optional[asyncio.Semaphore] = None
+running_jobs = set()
 
 
 def handle_signal(sig, frame):
@@ -50,24 +61,53 @@ signal.signal(signal.SIGINT, handle_signal)
 signal.signal(signal.SIGTERM, handle_signal)
 
 
+callback_client: Optional[httpx.AsyncClient] = None
+
+
+def get_callback_client() -> httpx.AsyncClient:
+    global callback_client
+    if callback_client is None:
+        callback_client = httpx.AsyncClient(
+            base_url=BACKEND_URL,
+            timeout=10,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=WORKER_CONCURRENCY * 2,
+                max_keepalive_connections=WORKER_CONCURRENCY,
+                keepalive_expiry=60,
+            ),
+            headers={
+                "Content-Type": "application/json",
+                "X-Worker-Secret": WORKER_SECRET,
+            },
+        )
+    return callback_client
+
+
+async def close_callback_client():
+    global callback_client
+    if callback_client is not None:
+        await callback_client.aclose()
+        callback_client = None
+
+
 async def send_callback(job_id: str, **kwargs):
     payload = {"jobId": job_id, **kwargs}
-    headers = {
-        "Content-Type": "application/json",
-        "X-Worker-Secret": WORKER_SECRET,
-    }
+    start = time.perf_counter()
 
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(
-                f"{BACKEND_URL}/api/webhooks/worker",
-                json=payload,
-                headers=headers,
+        client = get_callback_client()
+        resp = await client.post("/api/webhooks/worker", json=payload)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if resp.status_code != 200:
+            logger.warning(
+                f"Callback failed for job {job_id}: {resp.status_code} {resp.text} ({latency_ms:.0f}ms)"
             )
-            if resp.status_code != 200:
-                logger.warning(f"Callback failed for job {job_id}: {resp.status_code} {resp.text}")
+        else:
+            logger.debug(f"Callback for job {job_id} sent in {latency_ms:.0f}ms ({resp.http_version})")
     except Exception as e:
-        logger.error(f"Callback error for job {job_id}: {e}")
+        latency_ms = (time.perf_counter() - start) * 1000
+        logger.error(f"Callback error for job {job_id} after {latency_ms:.0f}ms: {e}")
 
 
 async def process_job(job_data: dict):
@@ -75,15 +115,18 @@ async def process_job(job_data: dict):
     template_slug = job_data.get("templateSlug")
     task_description = job_data.get("taskDescription")
     parameters = job_data.get("parameters", {})
+    session_owner.set(str(job_data.get("userId") or ""))
 
     logger.info(f"Processing job {job_id} (template: {template_slug})")
 
     start_time = time.time()
 
-    async def callback_fn(**kwargs):
+    async def send_fn(**kwargs):
         await send_callback(job_id, **kwargs)
 
-    await send_callback(job_id, status="processing", logs=["Job started"])
+    callback_fn = CallbackBuffer(send_fn)
+
+    await callback_fn(status="processing", logs=["Job started"])
 
     try:
         if template_slug and template_slug in TEMPLATE_MAP:
@@ -96,8 +139,7 @@ async def process_job(job_data: dict):
             raise ValueError("No template or task description provided")
 
         execution_time = int((time.time() - start_time) * 1000)
-        await send_callback(
-            job_id,
+        await callback_fn(
             status="completed",
             result=result,
             executionTime=execution_time,
@@ -108,8 +150,7 @@ async def process_job(job_data: dict):
     except Exception as e:
         execution_time = int((time.time() - start_time) * 1000)
         logger.error(f"Job {job_id} failed: {e}")
-        await send_callback(
-            job_id,
+        await callback_fn(
             status="failed",
             error=str(e),
             executionTime=execution_time,
@@ -119,8 +160,9 @@ async def process_job(job_data: dict):
 
 async def run_custom_task(task_description: str, parameters: dict, job_id: str, callback_fn) -> dict:
     context = await browser_manager.create_context(job_id)
+    handoff_watcher = HandoffWatcher()
+    await handoff_watcher.attach(context)
     page = await context.new_page()
-    await apply_stealth(page)
 
     screenshot_task = await browser_manager.run_with_screenshots(
         page, job_id, callback_fn, interval=3.0
@@ -153,7 +195,7 @@ Return a JSON array of action objects like:
 
 Only return the JSON array, no other text."""
 
-        plan_text = await llm_router.generate(planning_prompt)
+        plan_text = await llm_router.generate(planning_prompt, hedge=True, cache_scope="custom_task")
 
         try:
             start = plan_text.find("[")
@@ -166,36 +208,48 @@ Only return the JSON array, no other text."""
             actions = [{"action": "goto", "url": "https://www.google.com"}]
 
         await callback_fn(logs=[f"Plan created with {len(actions)} steps"])
+
+        first_url = next((a.get("url") for a in actions if a.get("action") == "goto" and a.get("url")), None)
+        session_key = make_session_key(first_url, parameters.get("account")) if first_url else None
+        if session_key and await load_session(context, session_key):
+            await callback_fn(logs=["Restored saved session"])
+
         results = {}
+        ready_wait_total = 0.0
 
         for i, action in enumerate(actions):
             action_type = action.get("action", "")
             await callback_fn(logs=[f"Step {i + 1}/{len(actions)}: {action_type}"])
 
-            handoff_reason = await check_for_handoff(page)
+            handoff_reason = await handoff_watcher.consume(page)
             if handoff_reason:
                 await callback_fn(
                     logs=[f"Handoff required: {handoff_reason}"],
                     handoff={"reason": handoff_reason},
                 )
-                await asyncio.sleep(300)
+                async with parked_slot():
+                    resolved = await wait_for_handoff_resolution(job_id, timeout=HANDOFF_TIMEOUT)
+                await callback_fn(
+                    logs=["Handoff resolved, resuming" if resolved else "Handoff timed out, resuming"]
+                )
+                browser_manager.mark_activity(page)
 
             try:
                 if action_type == "goto":
                     url = action.get("url", "")
                     await page.goto(url, wait_until="domcontentloaded", timeout=30000)
-                    await asyncio.sleep(2)
+                    ready_wait_total += await wait_until_ready(page, timeout=10)
 
                 elif action_type == "click":
                     selector = action.get("selector", "")
                     await page.click(selector, timeout=10000)
-                    await asyncio.sleep(1)
+                    ready_wait_total += await wait_until_ready(page, timeout=5)
 
                 elif action_type == "type":
                     selector = action.get("selector", "")
                     text = action.get("text", "")
                     await page.fill(selector, text)
-                    await asyncio.sleep(0.5)
+                    ready_wait_total += await wait_until_ready(page, quiet_ms=200, timeout=2)
 
                 elif action_type == "wait":
                     seconds = action.get("seconds", 2)
@@ -220,14 +274,20 @@ Only return the JSON array, no other text."""
                 elif action_type == "press":
                     key = action.get("key", "Enter")
                     await page.keyboard.press(key)
-                    await asyncio.sleep(0.5)
+                    ready_wait_total += await wait_until_ready(page, timeout=5)
 
             except Exception as e:
                 await callback_fn(logs=[f"Step {i + 1} error: {str(e)}"])
                 logger.warning(f"Action {action_type} failed: {e}")
 
-        await save_session(context, job_id)
-        await callback_fn(logs=["Custom task completed"])
+            browser_manager.mark_activity(page)
+
+        if session_key:
+            await save_session(context, session_key)
+        await callback_fn(logs=[
+            "Custom task completed",
+            f"Waited {ready_wait_total:.1f}s in total for page readiness",
+        ])
 
         if not results:
             page_text = await page.inner_text("body")
@@ -241,57 +301,109 @@ Only return the JSON array, no other text."""
             await screenshot_task
         except asyncio.CancelledError:
             pass
-        await context.close()
+        await browser_manager.release_context(context)
 
 
-async def main():
-    logger.info("AutomateFlow Worker starting...")
-    logger.info(f"Redis: {REDIS_URL}")
-    logger.info(f"Backend: {BACKEND_URL}")
+@asynccontextmanager
+async def parked_slot():
+    # Lets another job run while this one waits on something external
+    # (e.g. a human solving a CAPTCHA); the slot is taken back afterwards.
+    job_slots.release()
+    try:
+        yield
+    finally:
+        await job_slots.acquire()
 
-    await browser_manager.start()
 
-    redis_client = redis.from_url(REDIS_URL)
+async def run_dequeued_job(job_redis_id: str, job_data: dict, redis_client):
+    try:
+        await process_job(job_data)
+        await redis_client.lrem(f"bull:{QUEUE_NAME}:active", 1, job_redis_id)
+    except Exception as e:
+        logger.error(f"Failed to finish job {job_data.get('jobId', 'unknown')}: {e}")
+    finally:
+        job_slots.release()
+
 
+async def dispatch_jobs(redis_client):
     logger.info(f"Listening on queue: bull:{QUEUE_NAME}:wait")
 
-    try:
-        while not shutdown_event.is_set():
-            try:
-                result = redis_client.brpoplpush(
-                    f"bull:{QUEUE_NAME}:wait",
-                    f"bull:{QUEUE_NAME}:active",
-                    timeout=5,
-                )
+    while not shutdown_event.is_set():
+        await job_slots.acquire()
+        dispatched = False
+        try:
+            if shutdown_event.is_set():
+                break
 
-                if result is None:
-                    continue
+            result = await redis_client.brpoplpush(
+                f"bull:{QUEUE_NAME}:wait",
+                f"bull:{QUEUE_NAME}:active",
+                timeout=5,
+            )
 
-                job_redis_id = result.decode("utf-8") if isinstance(result, bytes) else result
-                job_key = f"bull:{QUEUE_NAME}:{job_redis_id}"
-                job_raw = redis_client.hget(job_key, "data")
+            if result is None:
+                continue
 
-                if not job_raw:
-                    logger.warning(f"No data found for job key: {job_key}")
-                    continue
+            job_redis_id = result.decode("utf-8") if isinstance(result, bytes) else result
+            job_key = f"bull:{QUEUE_NAME}:{job_redis_id}"
+            job_raw = await redis_client.hget(job_key, "data")
 
-                job_data = json.loads(job_raw)
-                logger.info(f"Dequeued job: {job_data.get('jobId', 'unknown')}")
+            if not job_raw:
+                logger.warning(f"No data found for job key: {job_key}")
+                continue
 
-                await process_job(job_data)
+            job_data = json.loads(job_raw)
+            logger.info(f"Dequeued job: {job_data.get('jobId', 'unknown')}")
 
-                redis_client.lrem(f"bull:{QUEUE_NAME}:active", 1, job_redis_id)
+            task = asyncio.create_task(run_dequeued_job(job_redis_id, job_data, redis_client))
+            running_jobs.add(task)
+            task.add_done_callback(running_jobs.discard)
+            dispatched = True
 
-            except redis.ConnectionError as e:
-                logger.error(f"Redis connection error: {e}")
-                await asyncio.sleep(5)
-            except Exception as e:
-                logger.error(f"Worker loop error: {e}")
-                await asyncio.sleep(1)
+        except redis.ConnectionError as e:
+            logger.error(f"Redis connection error: {e}")
+            await asyncio.sleep(5)
+        except Exception as e:
+            logger.error(f"Worker loop error: {e}")
+            await asyncio.sleep(1)
+        finally:
+            if not dispatched:
+                job_slots.release()
+
+    if running_jobs:
+        logger.info(f"Draining {len(running_jobs)} running job(s)")
+        await asyncio.gather(*list(running_jobs), return_exceptions=True)
+
+
+async def main():
+    logger.info("AutomateFlow Worker starting...")
+    logger.info(f"Redis: {REDIS_URL}")
+    logger.info(f"Backend: {BACKEND_URL}")
+    logger.info(f"Concurrency: {WORKER_CONCURRENCY} job slots")
+
+    await browser_manager.start()
+
+    redis_pool = aioredis.ConnectionPool.from_url(
+        REDIS_URL, max_connections=WORKER_CONCURRENCY * 2
+    )
+    redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+    global job_slots
+    job_slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+
+    try:
+        await dispatch_jobs(redis_client)
 
     finally:
         await browser_manager.stop()
-        redis_client.close()
+        await drain_uploads()
+        await close_callback_client()
+        await llm_router.close()
+        await close_selector_cache()
+        await close_handoff_redis()
+        await close_session_store()
+        await redis_client.aclose()
+        await redis_pool.disconnect()
         logger.info("Worker stopped")
 
 